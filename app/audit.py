@@ -0,0 +1,239 @@
+"""Ledger integrity audit.
+
+Re-derives every record's txid with :func:`app.ledger.compute_txid` and
+re-checks its HMAC (``sig``, ``receipt_sig`` or ``transcript_sig``) with the
+server key, and flags torn or unparseable lines. The file is split into byte
+ranges audited in parallel across all cores; a checkpoint file lets an
+interrupted audit resume with the ranges it has not finished.
+
+Usage::
+
+    python -m app.audit [--ledger FILE ...] [--workers N] [--chunk-mb 64]
+                        [--checkpoint audit.ckpt.json] [--report issues.ndjson]
+
+Without ``--ledger`` every file of the configured ledger (all shards) is
+audited. Exits 1 if any record fails a check. Only the bytes present when
+the audit starts are covered.
+"""
+
+import argparse
+import hmac
+import json
+import multiprocessing
+import os
+import sys
+import time
+from typing import Any, Dict, Iterator, List, Optional, Tuple
+
+from . import ledger
+from .utils import canonical_json, get_server_key, hmac_sign_bytes, parse_secret
+
+# Fields that may carry a record's HMAC, by record family
+SIG_FIELDS = ("sig", "receipt_sig", "transcript_sig")
+# Issues kept per chunk in the summary (counts are always exact)
+MAX_ISSUES_PER_CHUNK = 1000
+COUNTERS = ("records", "ok", "bad_txid", "bad_sig", "unsigned", "torn")
+
+
+def check_record(obj: Dict[str, Any], key: bytes) -> List[str]:
+    """Problems with one parsed ledger record ('unsigned' is informational)."""
+    problems = []
+    body = dict(obj)
+    txid = body.pop("txid", None)
+    if not isinstance(txid, str):
+        problems.append("bad_txid")
+    else:
+        # Sharded txids also carry the client's routing prefix
+        route, digest = ledger.split_txid(txid)
+        if ledger.compute_txid(body) != digest or (route is not None and route != ledger.route_key(body.get("client_id"))):
+            problems.append("bad_txid")
+    field = next((f for f in SIG_FIELDS if f in body), None)
+    if field is None:
+        problems.append("unsigned")
+    else:
+        sig = body.pop(field)
+        expected = hmac_sign_bytes(key, canonical_json(body))
+        if not isinstance(sig, str) or not hmac.compare_digest(sig, expected):
+            problems.append("bad_sig")
+    return problems
+
+
+def chunk_ranges(size: int, chunk_bytes: int) -> List[Tuple[int, int]]:
+    return [(start, min(start + chunk_bytes, size)) for start in range(0, size, chunk_bytes)]
+
+
+def _iter_lines(path: str, start: int, end: int) -> Iterator[Tuple[int, bytes]]:
+    """Lines that *begin* in [start, end), with their byte offsets."""
+    with open(path, "rb") as f:
+        if start > 0:
+            f.seek(start - 1)
+            if f.read(1) != b"\n":
+                f.readline()  # finish the line owned by the previous chunk
+        pos = f.tell()
+        while pos < end:
+            line = f.readline()
+            if not line:
+                break
+            yield pos, line
+            pos += len(line)
+
+
+def audit_range(path: str, start: int, end: int, key: bytes) -> Dict[str, Any]:
+    """Audit the records beginning in one byte range."""
+    result: Dict[str, Any] = {"start": start, "end": end, "issues": []}
+    result.update({c: 0 for c in COUNTERS})
+
+    def issue(kind: str, offset: int, txid: Optional[str] = None) -> None:
+        if len(result["issues"]) < MAX_ISSUES_PER_CHUNK:
+            result["issues"].append({"offset": offset, "kind": kind, "txid": txid})
+
+    for offset, line in _iter_lines(path, start, end):
+        if not line.endswith(b"\n"):
+            result["torn"] += 1
+            issue("torn", offset)
+            continue
+        try:
+            obj = json.loads(line)
+            if not isinstance(obj, dict):
+                raise ValueError("not an object")
+        except ValueError:
+            result["torn"] += 1
+            issue("torn", offset)
+            continue
+        result["records"] += 1
+        problems = check_record(obj, key)
+        for kind in problems:
+            result[kind] += 1
+            if kind != "unsigned":
+                issue(kind, offset, obj.get("txid"))
+        if not any(p != "unsigned" for p in problems):
+            result["ok"] += 1
+    return result
+
+
+def _audit_task(args: Tuple[str, int, int, bytes]) -> Dict[str, Any]:
+    return audit_range(*args)
+
+
+def _load_checkpoint(path: Optional[str], ledger_path: str, size: int, chunk_bytes: int) -> Dict[str, Any]:
+    fresh = {"ledger": os.path.abspath(ledger_path), "size": size, "chunk_bytes": chunk_bytes, "done": {}}
+    if not path or not os.path.exists(path):
+        return fresh
+    with open(path, "r", encoding="utf-8") as f:
+        ckpt = json.load(f)
+    # Only resume an audit of the same file region with the same chunking
+    if (ckpt.get("ledger"), ckpt.get("chunk_bytes")) != (fresh["ledger"], chunk_bytes) or ckpt.get("size", 0) > size:
+        return fresh
+    if ckpt["size"] != size:
+        # The ledger grew: finished chunks still hold, the short last one does not
+        ckpt["done"] = {s: r for s, r in ckpt["done"].items() if r["end"] - r["start"] == chunk_bytes}
+        ckpt["size"] = size
+    return ckpt
+
+
+def _save_checkpoint(path: str, ckpt: Dict[str, Any]) -> None:
+    tmp = f"{path}.tmp"
+    with open(tmp, "w", encoding="utf-8") as f:
+        json.dump(ckpt, f)
+    os.replace(tmp, path)
+
+
+def audit_ledger(
+    path: str,
+    key: bytes,
+    workers: Optional[int] = None,
+    chunk_bytes: int = 64 * 1024 * 1024,
+    checkpoint: Optional[str] = None,
+    progress=None,
+) -> Dict[str, Any]:
+    """Audit ``path`` in parallel and return the merged summary.
+
+    ``progress(done_bytes, total_bytes)`` is called after each chunk.
+    """
+    size = os.path.getsize(path) if os.path.exists(path) else 0
+    ckpt = _load_checkpoint(checkpoint, path, size, chunk_bytes)
+    todo = [(path, s, e, key) for s, e in chunk_ranges(size, chunk_bytes) if str(s) not in ckpt["done"]]
+    done_bytes = sum(r["end"] - r["start"] for r in ckpt["done"].values())
+    resumed_bytes = done_bytes
+
+    if todo:
+        with multiprocessing.Pool(processes=workers or os.cpu_count() or 1) as pool:
+            for result in pool.imap_unordered(_audit_task, todo):
+                ckpt["done"][str(result["start"])] = result
+                done_bytes += result["end"] - result["start"]
+                if checkpoint:
+                    _save_checkpoint(checkpoint, ckpt)
+                if progress:
+                    progress(done_bytes, size)
+
+    summary: Dict[str, Any] = {"ledger": os.path.abspath(path), "bytes": size, "resumed_bytes": resumed_bytes}
+    summary.update({c: 0 for c in COUNTERS})
+    issues: List[Dict[str, Any]] = []
+    for result in sorted(ckpt["done"].values(), key=lambda r: r["start"]):
+        for c in COUNTERS:
+            summary[c] += result[c]
+        issues.extend(result["issues"])
+    summary["intact"] = not (summary["bad_txid"] or summary["bad_sig"] or summary["torn"])
+    summary["issues"] = issues
+    return summary
+
+
+def merge_summaries(summaries: List[Dict[str, Any]]) -> Dict[str, Any]:
+    """Combine per-file summaries (issues gain a ``ledger`` field)."""
+    merged: Dict[str, Any] = {"ledgers": [s["ledger"] for s in summaries], "bytes": 0, "resumed_bytes": 0}
+    merged.update({c: 0 for c in COUNTERS})
+    merged["issues"] = []
+    for s in summaries:
+        for c in ("bytes", "resumed_bytes") + COUNTERS:
+            merged[c] += s[c]
+        merged["issues"].extend({**i, "ledger": s["ledger"]} for i in s["issues"])
+    merged["intact"] = all(s["intact"] for s in summaries)
+    return merged
+
+
+def main(argv: Optional[List[str]] = None) -> int:
+    parser = argparse.ArgumentParser(prog="python -m app.audit", description="Audit ledger txids and signatures.")
+    parser.add_argument("--ledger", action="append", help="ledger JSONL file, repeatable (default: all ledger shards)")
+    parser.add_argument("--key", help="HMAC key (hex/base64/raw); default: SERVER_KEY or data/hmac.key")
+    parser.add_argument("--workers", type=int, default=None, help="worker processes (default: all cores)")
+    parser.add_argument("--chunk-mb", type=float, default=64, help="byte range per task in MiB")
+    parser.add_argument("--checkpoint", help="checkpoint file (one per ledger file, suffixed .N); resumes from it if present")
+    parser.add_argument("--report", help="write every issue found as NDJSON to this file")
+    args = parser.parse_args(argv)
+
+    paths = args.ledger or ledger.ledger_files()
+    key = parse_secret(args.key) if args.key else get_server_key()
+    started = time.monotonic()
+
+    def progress(done: int, total: int) -> None:
+        rate = done / max(time.monotonic() - started, 1e-9) / 2**20
+        print(f"\raudited {done / 2**20:.1f}/{total / 2**20:.1f} MiB ({100 * done / max(total, 1):.0f}%) {rate:.1f} MiB/s",
+              end="", file=sys.stderr, flush=True)
+
+    summaries = []
+    for i, path in enumerate(paths):
+        checkpoint = args.checkpoint
+        if checkpoint and len(paths) > 1:
+            checkpoint = f"{checkpoint}.{i}"
+        summaries.append(audit_ledger(
+            path,
+            key,
+            workers=args.workers,
+            chunk_bytes=max(1, int(args.chunk_mb * 2**20)),
+            checkpoint=checkpoint,
+            progress=progress,
+        ))
+    print(file=sys.stderr)
+    summary = merge_summaries(summaries)
+    issues = summary.pop("issues")
+    if args.report:
+        with open(args.report, "w", encoding="utf-8") as f:
+            for item in issues:
+                f.write(json.dumps(item) + "\n")
+    summary["elapsed_s"] = round(time.monotonic() - started, 3)
+    print(json.dumps(summary, indent=2))
+    return 0 if summary["intact"] else 1
+
+
+if __name__ == "__main__":
+    sys.exit(main())
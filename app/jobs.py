@@ -0,0 +1,461 @@
+"""Asynchronous bulk verification jobs.
+
+A job checks a corpus of documents against their tickets or ledger evidence
+without one HTTP request (and one ledger append) per document. Sources are
+either an NDJSON file, one document per line::
+
+    {"id": "doc-1", "content": "...", "ticket": {...}}
+    {"id": "doc-2", "path": "docs/2.txt", "txid": "<hex>"}
+
+or a directory of documents, where ``<name>.ticket.json`` next to a file
+holds its ``ticket``/``txid``/``commitment`` (otherwise the job-level
+evidence applies).
+
+The source and every document or sidecar it names must resolve (symlinks
+included) inside the source root, ``JOBS_SOURCE_ROOT`` (default
+``data/corpus``); documents outside it get a per-document error.
+
+Detection runs in a process pool in batches. Each job lives in
+``data/jobs/<job_id>/``: ``spec.json``, ``state.json`` (checkpoint),
+``results.ndjson`` and, once finished, ``summary.json`` with the signed
+summary transcript that is also appended to the ledger. Per-document
+transcripts, when requested, are appended to the ledger one batch per write.
+
+A checkpoint is taken after every batch; a job interrupted by a crash
+resumes from its last checkpoint (results past it are truncated), and a
+failed job can be re-queued with :meth:`JobManager.retry` to do the same.
+Bad input lines and sidecars are per-document errors, never job failures. Every
+server worker re-queues unfinished jobs at startup; an exclusive ``flock``
+on ``<job_id>/lock`` makes sure only one of them runs a given job. Ledger
+writes are at-least-once: a batch appended just before a crash is appended
+again on resume.
+"""
+
+import hashlib
+import json
+import multiprocessing
+import os
+import queue
+import secrets
+import threading
+from collections import deque
+from contextlib import contextmanager
+from concurrent.futures import Future, ProcessPoolExecutor
+from itertools import islice
+from typing import Any, Callable, Deque, Dict, Iterator, List, Optional, Set
+
+from . import ledger
+from .pow import derive_seed, ticket_hash_hex
+from .utils import DATA_DIR, get_server_salt, hmac_sign, now_ms, sha256_hex
+from .watermark.detect import detect_text, detect_with_key
+
+try:
+    import fcntl
+except ImportError:  # Windows: in-process locking only
+    fcntl = None  # type: ignore
+
+JOBS_DIR = os.path.join(DATA_DIR, "jobs")
+SIDECAR_SUFFIX = ".ticket.json"
+OUTSIDE_ROOT = "Path outside the job source root"
+
+Lookup = Callable[[str], Optional[Dict[str, Any]]]
+
+
+# --- Worker side (runs in the process pool; must stay importable without app.main) ---
+def _detect_one(item: Dict[str, Any], server_salt: bytes) -> Dict[str, Any]:
+    if "error" in item:
+        return {"id": item["id"], "error": item["error"]}
+    if "path" in item:
+        with open(item["path"], "rb") as f:
+            content = f.read()
+    else:
+        content = item["content"].encode()
+    out: Dict[str, Any] = {"id": item["id"], "content_hash": sha256_hex(content)}
+    if item.get("ticket") is not None:
+        seed = derive_seed(item["ticket"], server_salt)
+        det = detect_with_key(content, seed)
+        out["commitment"] = sha256_hex(seed + server_salt)
+        out["ticket_hash"] = ticket_hash_hex(item["ticket"])
+        present = det["present"]
+    else:
+        det = detect_text(content, item["commitment"], server_salt)
+        out["commitment"] = item["commitment"]
+        present = det["statistic"] >= 1.0 and det["pvalue"] <= 0.05
+    out.update(statistic=det["statistic"], pvalue=det["pvalue"], present=present)
+    return out
+
+
+def detect_batch(items: List[Dict[str, Any]], server_salt: bytes) -> List[Dict[str, Any]]:
+    """Run detection over one batch of prepared items."""
+    results = []
+    for item in items:
+        try:
+            results.append(_detect_one(item, server_salt))
+        except Exception as e:
+            results.append({"id": item["id"], "error": str(e)})
+    return results
+
+
+# --- Job inputs ---
+def source_root() -> str:
+    """Directory job sources must stay inside (JOBS_SOURCE_ROOT, default data/corpus)."""
+    return os.path.realpath(os.getenv("JOBS_SOURCE_ROOT") or os.path.join(DATA_DIR, "corpus"))
+
+
+def resolve_within(path: str, root: str) -> Optional[str]:
+    """``path`` with symlinks resolved, or None if that lies outside ``root``."""
+    real = os.path.realpath(path)
+    return real if os.path.commonpath([root, real]) == root else None
+
+
+def _resolve_evidence(obj: Dict[str, Any], default: Dict[str, Any], lookup: Lookup) -> Dict[str, Any]:
+    """Reduce a document's evidence to a ``ticket`` or a ``commitment``."""
+    if obj.get("ticket") is not None:
+        return {"ticket": obj["ticket"]}
+    if obj.get("txid"):
+        rec = lookup(obj["txid"])
+        return {"commitment": rec["commitment"]} if rec else {"error": "Unknown txid"}
+    if obj.get("commitment"):
+        return {"commitment": obj["commitment"]}
+    if default:
+        return _resolve_evidence(default, {}, lookup)
+    return {"error": "No ticket, txid or commitment"}
+
+
+def _iter_ndjson(spec: Dict[str, Any], lookup: Lookup) -> Iterator[Dict[str, Any]]:
+    base = os.path.dirname(os.path.abspath(spec["source"]))
+    root = spec.get("root") or source_root()
+    with open(spec["source"], "r", encoding="utf-8") as f:
+        for lineno, line in enumerate(f):
+            try:
+                obj = json.loads(line)
+            except ValueError:
+                yield {"id": lineno, "error": "Unparseable line"}
+                continue
+            if not isinstance(obj, dict):
+                yield {"id": lineno, "error": "Line is not a JSON object"}
+                continue
+            item: Dict[str, Any] = {"id": obj.get("id", lineno)}
+            if "content" in obj:
+                item["content"] = obj["content"]
+            elif "path" in obj:
+                path = resolve_within(os.path.join(base, str(obj["path"])), root)
+                if path is None:
+                    yield {**item, "error": OUTSIDE_ROOT}
+                    continue
+                item["path"] = path
+            else:
+                item["error"] = "No content or path"
+            item.update(_resolve_evidence(obj, spec.get("evidence") or {}, lookup))
+            yield item
+
+
+def _dir_entries(source: str) -> List[str]:
+    return sorted(
+        name for name in os.listdir(source)
+        if not name.endswith(SIDECAR_SUFFIX) and os.path.isfile(os.path.join(source, name))
+    )
+
+
+def _iter_dir(spec: Dict[str, Any], lookup: Lookup) -> Iterator[Dict[str, Any]]:
+    source = spec["source"]
+    root = spec.get("root") or source_root()
+    for name in _dir_entries(source):
+        path = resolve_within(os.path.join(source, name), root)
+        sidecar_path = os.path.join(source, name + SIDECAR_SUFFIX)
+        if os.path.exists(sidecar_path):
+            sidecar_path = resolve_within(sidecar_path, root)
+        if path is None or sidecar_path is None:
+            yield {"id": name, "error": OUTSIDE_ROOT}
+            continue
+        sidecar: Dict[str, Any] = {}
+        if os.path.exists(sidecar_path):
+            try:
+                with open(sidecar_path, "r", encoding="utf-8") as f:
+                    sidecar = json.load(f)
+            except (OSError, ValueError):
+                yield {"id": name, "error": "Unreadable sidecar"}
+                continue
+            if not isinstance(sidecar, dict):
+                yield {"id": name, "error": "Sidecar is not a JSON object"}
+                continue
+        item: Dict[str, Any] = {"id": name, "path": path}
+        item.update(_resolve_evidence(sidecar, spec.get("evidence") or {}, lookup))
+        yield item
+
+
+def iter_items(spec: Dict[str, Any], lookup: Lookup) -> Iterator[Dict[str, Any]]:
+    """Prepared worker items for a job spec, in a stable order."""
+    if spec["format"] == "dir":
+        return _iter_dir(spec, lookup)
+    return _iter_ndjson(spec, lookup)
+
+
+def count_items(spec: Dict[str, Any]) -> int:
+    if spec["format"] == "dir":
+        return len(_dir_entries(spec["source"]))
+    with open(spec["source"], "rb") as f:
+        return sum(1 for _ in f)
+
+
+# --- Job bookkeeping ---
+def _write_json_atomic(path: str, obj: Any) -> None:
+    tmp = f"{path}.tmp"
+    with open(tmp, "w", encoding="utf-8") as f:
+        json.dump(obj, f, ensure_ascii=False)
+        f.flush()
+        os.fsync(f.fileno())
+    os.replace(tmp, path)
+
+
+def _read_json(path: str) -> Any:
+    with open(path, "r", encoding="utf-8") as f:
+        return json.load(f)
+
+
+def _file_sha256(path: str) -> str:
+    h = hashlib.sha256()
+    with open(path, "rb") as f:
+        for chunk in iter(lambda: f.read(1 << 20), b""):
+            h.update(chunk)
+    return h.hexdigest()
+
+
+class JobManager:
+    """Queues bulk verification jobs and runs them one at a time.
+
+    ``lookup`` resolves txids to issue records (default: the local ledger).
+    """
+
+    def __init__(self, jobs_dir: str = JOBS_DIR, workers: Optional[int] = None, lookup: Optional[Lookup] = None):
+        self.jobs_dir = jobs_dir
+        self.workers = workers or int(os.getenv("JOBS_WORKERS", "0")) or os.cpu_count() or 1
+        self.lookup = lookup
+        self._queue: "queue.Queue[Optional[str]]" = queue.Queue()
+        self._thread: Optional[threading.Thread] = None
+        self._held: Set[str] = set()
+        self._held_lock = threading.Lock()
+
+    # --- Paths & state ---
+    def _path(self, job_id: str, name: str) -> str:
+        return os.path.join(self.jobs_dir, job_id, name)
+
+    def status(self, job_id: str) -> Optional[Dict[str, Any]]:
+        if not job_id.isalnum():
+            return None
+        try:
+            return _read_json(self._path(job_id, "state.json"))
+        except (FileNotFoundError, ValueError):
+            return None
+
+    def results_path(self, job_id: str) -> str:
+        return self._path(job_id, "results.ndjson")
+
+    def _save_state(self, job_id: str, state: Dict[str, Any]) -> None:
+        state["updated_ts"] = now_ms()
+        _write_json_atomic(self._path(job_id, "state.json"), state)
+
+    # --- Queue ---
+    def submit(self, spec: Dict[str, Any]) -> str:
+        job_id = secrets.token_hex(8)
+        os.makedirs(os.path.join(self.jobs_dir, job_id))
+        _write_json_atomic(self._path(job_id, "spec.json"), spec)
+        self._save_state(job_id, {
+            "job_id": job_id,
+            "status": "queued",
+            "total": None,
+            "done": 0,
+            "present": 0,
+            "absent": 0,
+            "errors": 0,
+            "results_offset": 0,
+            "created_ts": now_ms(),
+        })
+        self._queue.put(job_id)
+        self.start()
+        return job_id
+
+    def resume(self) -> List[str]:
+        """Re-queue jobs left queued or running by a previous process."""
+        if not os.path.isdir(self.jobs_dir):
+            return []
+        resumed = []
+        for job_id in sorted(os.listdir(self.jobs_dir)):
+            state = self.status(job_id)
+            if state and state["status"] in ("queued", "running"):
+                self._queue.put(job_id)
+                resumed.append(job_id)
+        if resumed:
+            self.start()
+        return resumed
+
+    def retry(self, job_id: str) -> Optional[Dict[str, Any]]:
+        """Re-queue a failed job; it resumes from its last checkpoint.
+
+        Returns the job's state, or None if it is unknown. Jobs that have
+        not failed are left as they are.
+        """
+        state = self.status(job_id)
+        if state is None or state["status"] != "failed":
+            return state
+        state["status"] = "queued"
+        state.pop("error", None)
+        self._save_state(job_id, state)
+        self._queue.put(job_id)
+        self.start()
+        return state
+
+    def _run(self) -> None:
+        while True:
+            job_id = self._queue.get()
+            if job_id is None:
+                return
+            self.run_job(job_id)
+
+    def start(self) -> None:
+        if self._thread is None:
+            self._thread = threading.Thread(target=self._run, name="bulk-jobs", daemon=True)
+            self._thread.start()
+
+    def stop(self) -> None:
+        if self._thread is not None:
+            self._queue.put(None)
+
+    # --- Execution ---
+    @contextmanager
+    def _job_lock(self, job_id: str) -> Iterator[bool]:
+        """Try to take the job's exclusive lock; yields whether it was taken."""
+        with self._held_lock:
+            if job_id in self._held:
+                yield False
+                return
+            self._held.add(job_id)
+        try:
+            if fcntl is None:
+                yield True
+                return
+            with open(self._path(job_id, "lock"), "a+b") as lf:
+                try:
+                    fcntl.flock(lf.fileno(), fcntl.LOCK_EX | fcntl.LOCK_NB)
+                except BlockingIOError:
+                    yield False
+                    return
+                try:
+                    yield True
+                finally:
+                    fcntl.flock(lf.fileno(), fcntl.LOCK_UN)
+        finally:
+            with self._held_lock:
+                self._held.discard(job_id)
+
+    def run_job(self, job_id: str) -> Dict[str, Any]:
+        """Run (or resume) a job to completion; returns its final state.
+
+        A job another worker is already running is skipped and its current
+        state returned.
+        """
+        with self._job_lock(job_id) as owned:
+            state = self.status(job_id)
+            assert state is not None
+            if not owned or state["status"] == "done":
+                return state
+            return self._run_locked(job_id, state)
+
+    def _run_locked(self, job_id: str, state: Dict[str, Any]) -> Dict[str, Any]:
+        spec = _read_json(self._path(job_id, "spec.json"))
+        try:
+            state["status"] = "running"
+            if state["total"] is None:
+                state["total"] = count_items(spec)
+            self._save_state(job_id, state)
+            self._process(job_id, spec, state)
+            self._finalize(job_id, spec, state)
+        except Exception as e:
+            state["status"] = "failed"
+            state["error"] = str(e)
+            self._save_state(job_id, state)
+        return state
+
+    def _process(self, job_id: str, spec: Dict[str, Any], state: Dict[str, Any]) -> None:
+        lookup = self.lookup or ledger.find_commitment_by_txid
+        server_salt = get_server_salt()
+        batch_size = int(spec.get("batch_size", 256))
+        items = islice(iter_items(spec, lookup), state["done"], None)
+
+        results_path = self.results_path(job_id)
+        # Drop anything written after the last checkpoint
+        with open(results_path, "ab") as out:
+            out.truncate(state["results_offset"])
+        ctx = multiprocessing.get_context("spawn")
+        with ProcessPoolExecutor(max_workers=self.workers, mp_context=ctx) as pool, open(results_path, "ab") as out:
+            pending: Deque[Future] = deque()
+            while True:
+                batch = list(islice(items, batch_size))
+                if batch:
+                    pending.append(pool.submit(detect_batch, batch, server_salt))
+                # Commit in submission order so the checkpoint is a prefix of the input
+                while pending and (not batch or len(pending) >= 2 * self.workers):
+                    self._commit(job_id, spec, state, pending.popleft().result(), out)
+                if not batch:
+                    break
+
+    def _commit(self, job_id: str, spec: Dict[str, Any], state: Dict[str, Any], results: List[Dict[str, Any]], out) -> None:
+        if spec.get("transcripts"):
+            signed = []
+            for res in results:
+                if "error" in res:
+                    continue
+                transcript = {
+                    "type": "verify",
+                    "ts": now_ms(),
+                    "client_id": spec["client_id"],
+                    "commitment": res["commitment"],
+                    "content_hash": res["content_hash"],
+                    "statistic": res["statistic"],
+                    "pvalue": res["pvalue"],
+                    "decision": res["present"],
+                    "policy_v": 1,
+                    "job_id": job_id,
+                }
+                if "ticket_hash" in res:
+                    transcript["ticket_hash"] = res["ticket_hash"]
+                res["sig"] = hmac_sign(transcript)
+                signed.append((res, {**transcript, "sig": res["sig"]}))
+            txids = ledger.append_records([rec for _, rec in signed])
+            for (res, _), txid in zip(signed, txids):
+                res["txid"] = txid
+
+        out.write("".join(json.dumps(r, ensure_ascii=False) + "\n" for r in results).encode())
+        out.flush()
+        os.fsync(out.fileno())
+        for res in results:
+            if "error" in res:
+                state["errors"] += 1
+            elif res["present"]:
+                state["present"] += 1
+            else:
+                state["absent"] += 1
+        state["done"] += len(results)
+        state["results_offset"] = out.tell()
+        self._save_state(job_id, state)
+
+    def _finalize(self, job_id: str, spec: Dict[str, Any], state: Dict[str, Any]) -> None:
+        summary = {
+            "type": "bulk_verify",
+            "ts": now_ms(),
+            "client_id": spec["client_id"],
+            "job_id": job_id,
+            "source": spec["source"],
+            "documents": state["done"],
+            "present": state["present"],
+            "absent": state["absent"],
+            "errors": state["errors"],
+            "results_hash": _file_sha256(self.results_path(job_id)),
+            "policy_v": 1,
+        }
+        sig = hmac_sign(summary)
+        txid = ledger.append_record({**summary, "sig": sig})
+        _write_json_atomic(self._path(job_id, "summary.json"), {"transcript": summary, "sig": sig, "txid": txid})
+        state["status"] = "done"
+        state["summary_txid"] = txid
+        self._save_state(job_id, state)
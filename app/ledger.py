@@ -1,26 +1,287 @@
-import os, json, hashlib, time
-from typing import Dict, Any, Optional
+import os, json, hashlib, threading
+from typing import Dict, Any, List, Optional, Tuple, Union
 
 LEDGER_PATH = os.path.join(os.path.dirname(__file__), "..", "data", "log.jsonl")
 os.makedirs(os.path.dirname(LEDGER_PATH), exist_ok=True)
 
-def append_record(record: Dict[str, Any])->str:
+# Sharding: with LEDGER_SHARDS > 1, records are routed by client_id to
+# LEDGER_SHARD_DIR/shard-NNN.jsonl, each with its own writer lock and index.
+# Sharded txids are prefixed with the client's routing bucket (ROUTE_HEX hex
+# chars), which is independent of the shard count, so a txid always resolves
+# to exactly one shard and stays valid across rebalancing.
+LEDGER_SHARDS = int(os.getenv("LEDGER_SHARDS", "1"))
+LEDGER_SHARD_DIR = os.getenv("LEDGER_SHARD_DIR") or os.path.join(os.path.dirname(LEDGER_PATH), "ledger")
+ROUTE_HEX = 4
+
+# Upper bound on bytes returned by one read_feed() call
+FEED_MAX_BYTES = 4 * 1024 * 1024
+
+def compute_txid(record: Dict[str, Any])->str:
+    """txid of a record (the record as appended, without its txid field)."""
     data = json.dumps(record, sort_keys=True).encode()
-    txid = hashlib.sha256(data).hexdigest()
+    return hashlib.sha256(data).hexdigest()
+
+def route_key(client_id: Any)->str:
+    """Routing bucket of a client (hex), independent of the shard count."""
+    return hashlib.sha256(str(client_id or "").encode()).hexdigest()[:ROUTE_HEX]
+
+def shard_of(route: str, shards: int)->int:
+    return int(route, 16) % shards
+
+def split_txid(txid: str)->Tuple[Optional[str], str]:
+    """(route, digest) of a txid; route is None for unsharded txids."""
+    if len(txid) == 64 + ROUTE_HEX:
+        return txid[:ROUTE_HEX], txid[ROUTE_HEX:]
+    return None, txid
+
+def shard_path(i: int, directory: Optional[str] = None)->str:
+    return os.path.join(directory or LEDGER_SHARD_DIR, f"shard-{i:03d}.jsonl")
+
+
+class _Shard:
+    """One ledger file with its own writer lock and lazily refreshed index."""
+
+    def __init__(self, path: str) -> None:
+        self.path = path
+        self._write_lock = threading.Lock()
+        self._index_lock = threading.Lock()
+        self._index = LedgerIndex(path)
+
+    def append(self, data: str) -> None:
+        with self._write_lock:
+            with open(self.path, "a", encoding="utf-8") as f:
+                f.write(data)
+
+    def size(self) -> int:
+        try:
+            return os.path.getsize(self.path)
+        except FileNotFoundError:
+            return 0
+
+    def index(self) -> "LedgerIndex":
+        """The shard's index, caught up with whatever any process appended."""
+        with self._index_lock:
+            size = self.size()
+            if size < self._index.offset:
+                # File replaced (e.g. rebalanced): rebuild
+                self._index = LedgerIndex(self.path)
+            if size > self._index.offset:
+                self._index.ingest_file(self.path)
+            return self._index
+
+
+_shard_sets: Dict[Tuple[str, int, str], List[_Shard]] = {}
+_shard_sets_lock = threading.Lock()
+
+def shards()->List[_Shard]:
+    """Shards for the current configuration (a single one when unsharded)."""
+    key = (LEDGER_PATH, LEDGER_SHARDS, LEDGER_SHARD_DIR)
+    with _shard_sets_lock:
+        found = _shard_sets.get(key)
+        if found is None:
+            if LEDGER_SHARDS <= 1:
+                paths = [LEDGER_PATH]
+            else:
+                os.makedirs(LEDGER_SHARD_DIR, exist_ok=True)
+                paths = [shard_path(i) for i in range(LEDGER_SHARDS)]
+            found = _shard_sets[key] = [_Shard(p) for p in paths]
+        return found
+
+def ledger_files()->List[str]:
+    return [s.path for s in shards()]
+
+def _route(record: Dict[str, Any])->Tuple[_Shard, str]:
+    all_shards = shards()
+    if len(all_shards) == 1:
+        return all_shards[0], ""
+    route = route_key(record.get("client_id"))
+    return all_shards[shard_of(route, len(all_shards))], route
+
+def _shards_for_txid(txid: str)->List[_Shard]:
+    all_shards = shards()
+    route, _ = split_txid(txid)
+    if route is None or len(all_shards) == 1:
+        # Unsharded txids (records migrated from a single ledger) may be in any shard
+        return all_shards
+    return [all_shards[shard_of(route, len(all_shards))]]
+
+def append_record(record: Dict[str, Any])->str:
+    shard, prefix = _route(record)
+    txid = prefix + compute_txid(record)
     line = json.dumps({"txid": txid, **record}, ensure_ascii=False)
-    with open(LEDGER_PATH, "a", encoding="utf-8") as f:
-        f.write(line + "\n")
+    shard.append(line + "\n")
     return txid
 
+def append_records(records: List[Dict[str, Any]])->List[str]:
+    """Append many records with one write per shard; returns their txids in order."""
+    txids = []
+    batches: Dict[int, Tuple[_Shard, List[str]]] = {}
+    for record in records:
+        shard, prefix = _route(record)
+        txid = prefix + compute_txid(record)
+        txids.append(txid)
+        line = json.dumps({"txid": txid, **record}, ensure_ascii=False)
+        batches.setdefault(id(shard), (shard, []))[1].append(line + "\n")
+    for shard, lines in batches.values():
+        shard.append("".join(lines))
+    return txids
+
 def find_commitment_by_txid(txid: str)->Optional[Dict[str, Any]]:
-    if not os.path.exists(LEDGER_PATH):
-        return None
-    with open(LEDGER_PATH, "r", encoding="utf-8") as f:
-        for line in f:
+    for shard in _shards_for_txid(txid):
+        rec = shard.index().get(txid)
+        if rec is not None:
+            return rec
+    return None
+
+def find_issue_by_commitment(commitment: str)->Optional[Dict[str, Any]]:
+    for shard in shards():
+        rec = shard.index().find_by_commitment(commitment)
+        if rec is not None:
+            return rec
+    return None
+
+def find_issue_by_stream_id(stream_id: str)->Optional[Dict[str, Any]]:
+    for shard in shards():
+        rec = shard.index().find_by_stream_id(stream_id)
+        if rec is not None:
+            return rec
+    return None
+
+def find_issue_by_output_hash(output_hash: str)->Optional[Dict[str, Any]]:
+    """Earliest issue record (per shard) whose watermarked output hashes to ``output_hash``."""
+    for shard in shards():
+        rec = shard.index().find_by_output_hash(output_hash)
+        if rec is not None:
+            return rec
+    return None
+
+
+# --- Change feed (primary side) ---
+def epoch_path(legacy_path: Optional[str] = None) -> str:
+    """File holding the ledger epoch, which changes whenever the files are rewritten."""
+    return f"{legacy_path or LEDGER_PATH}.epoch"
+
+def epoch() -> str:
+    """Current ledger epoch ("0" until the ledger is first rebalanced).
+
+    Byte offsets into the feed are only meaningful within one epoch.
+    """
+    try:
+        with open(epoch_path(), "r", encoding="utf-8") as f:
+            return f.read().strip() or "0"
+    except FileNotFoundError:
+        return "0"
+
+def ledger_size(shard: int = 0) -> int:
+    return shards()[shard].size()
+
+def read_feed(offset: int, max_bytes: int = FEED_MAX_BYTES, shard: int = 0) -> Tuple[bytes, int]:
+    """Read whole records of one shard starting at byte ``offset``.
+
+    Returns (data, next_offset); ``data`` ends on a record boundary so a
+    line still being written is never returned. A single record larger than
+    ``max_bytes`` is returned whole.
+    """
+    path = shards()[shard].path
+    if offset >= ledger_size(shard):
+        return b"", offset
+    with open(path, "rb") as f:
+        f.seek(offset)
+        data = f.read(max_bytes)
+        cut = data.rfind(b"\n")
+        if cut < 0:
+            # Oversized record: keep reading until its newline (or give up on a torn tail)
+            rest = f.readline()
+            data += rest
+            if not data.endswith(b"\n"):
+                return b"", offset
+            return data, offset + len(data)
+    data = data[:cut + 1]
+    return data, offset + len(data)
+
+
+class LedgerIndex:
+    """In-memory index built from raw ledger bytes.
+
+    Indexes issue records by txid, commitment, output_hash and (for streamed
+    issues) stream_id. Feed it consecutive byte
+    ranges of a ledger file with :meth:`ingest`; ``offset`` is the next byte
+    expected. When ``path`` names the file being indexed, only byte offsets
+    are kept and records are read back on lookup; otherwise whole records
+    are held in memory. Unparseable lines are counted in ``torn`` and skipped;
+    ``last_ts`` is the ``ts`` of the last record ingested.
+    """
+
+    def __init__(self, path: Optional[str] = None) -> None:
+        self.path = path
+        self.offset = 0
+        self.torn = 0
+        self.records = 0
+        self.last_ts: Optional[int] = None
+        self._partial = b""
+        self._issues: Dict[str, Union[int, Dict[str, Any]]] = {}
+        self._by_commitment: Dict[str, str] = {}
+        self._by_output_hash: Dict[str, str] = {}
+        self._by_stream_id: Dict[str, str] = {}
+
+    def __len__(self) -> int:
+        return len(self._issues)
+
+    def ingest(self, data: bytes) -> None:
+        pos = self.offset - len(self._partial)
+        self.offset += len(data)
+        lines = (self._partial + data).split(b"\n")
+        self._partial = lines.pop()
+        for line in lines:
+            start, pos = pos, pos + len(line) + 1
             try:
                 obj = json.loads(line)
-                if obj.get("txid") == txid and obj.get("type") == "issue":
-                    return obj
-            except Exception:
+            except ValueError:
+                self.torn += 1
                 continue
-    return None
+            self.records += 1
+            if isinstance(obj, dict) and isinstance(obj.get("ts"), int):
+                self.last_ts = obj["ts"]
+            self.add(obj, start)
+
+    def ingest_file(self, path: str, chunk_size: int = 1 << 20) -> None:
+        if not os.path.exists(path):
+            return
+        with open(path, "rb") as f:
+            f.seek(self.offset)
+            while True:
+                chunk = f.read(chunk_size)
+                if not chunk:
+                    break
+                self.ingest(chunk)
+
+    def add(self, obj: Dict[str, Any], offset: Optional[int] = None) -> None:
+        if not isinstance(obj, dict) or obj.get("type") != "issue" or "txid" not in obj:
+            return
+        self._issues[obj["txid"]] = offset if self.path and offset is not None else obj
+        if "commitment" in obj:
+            self._by_commitment.setdefault(obj["commitment"], obj["txid"])
+        if "output_hash" in obj:
+            self._by_output_hash.setdefault(obj["output_hash"], obj["txid"])
+        if "stream_id" in obj:
+            self._by_stream_id[obj["stream_id"]] = obj["txid"]
+
+    def get(self, txid: str) -> Optional[Dict[str, Any]]:
+        found = self._issues.get(txid)
+        if not isinstance(found, int):
+            return found
+        with open(self.path, "rb") as f:  # type: ignore[arg-type]
+            f.seek(found)
+            return json.loads(f.readline())
+
+    def find_by_commitment(self, commitment: str) -> Optional[Dict[str, Any]]:
+        txid = self._by_commitment.get(commitment)
+        return self.get(txid) if txid else None
+
+    def find_by_output_hash(self, output_hash: str) -> Optional[Dict[str, Any]]:
+        txid = self._by_output_hash.get(output_hash)
+        return self.get(txid) if txid else None
+
+    def find_by_stream_id(self, stream_id: str) -> Optional[Dict[str, Any]]:
+        txid = self._by_stream_id.get(stream_id)
+        return self.get(txid) if txid else None
@@ -1,36 +1,176 @@
+import asyncio
 import hashlib
-from fastapi import FastAPI, HTTPException
+import hmac
+import math
+import os
+import secrets
+from contextlib import asynccontextmanager
+from typing import Any, Dict, Optional, Tuple, Type, TypeVar, Union
+from fastapi import FastAPI, HTTPException, Query, Request
+from fastapi.responses import FileResponse, Response, StreamingResponse
+from starlette.concurrency import run_in_threadpool
+from starlette.datastructures import MutableHeaders
+from starlette.types import ASGIApp, Message, Receive, Scope, Send
+from pydantic import BaseModel, ValidationError
 from .models import (
     IssueRequest, IssueResponse, VerifyRequest, VerifyResponse,
-    IssueV2Request, IssueV2Response, Receipt,
-    VerifyV2Request, VerifyV2Response, DetectionResult,
+    IssueV2Request, IssueV2Response, Receipt, StreamReceipt, Ticket, PoWTicket, EvidenceV2,
+    VerifyV2Request, VerifyV2Response, DetectionResult, BulkVerifyRequest, ExactMatchResponse,
 )
-from .pow import validate_pow, serialize_ticket, ticket_hash_hex
+from .pow import validate_pow, serialize_ticket, ticket_hash_hex, derive_seed
 from . import ledger
+from .jobs import JobManager, resolve_within, source_root
+from .quota import QuotaTracker
+from .replica import FEED_TOKEN_HEADER, LedgerReplica
+from .replay import ReplayFilter
 from .utils import sha256_hex, hmac_sign, now_ms, get_server_salt, hkdf_sha256
-from .watermark.embed import embed_text, embed_with_key
+from .watermark.embed import embed_text, embed_with_key, embed_stream, watermark_suffix
 from .watermark.detect import detect_text, detect_with_key
 
-app = FastAPI(title="PoW-PVW (Local Demo)")
+quotas = QuotaTracker.from_env()
+# Set when this node is a verify-only replica (LEDGER_PRIMARY_URL)
+replica = LedgerReplica.from_env()
+jobs = JobManager(lookup=replica.find_commitment_by_txid if replica is not None else None)
+# Seen-ticket set shared by all workers on the host. Opened at startup rather
+# than at import, so importing the app never creates the shared segment; None
+# before startup and when REPLAY_WINDOW_S=0
+replay_filter: Optional[ReplayFilter] = None
+REPLAY_REQUIRE_EXPIRY = os.getenv("REPLAY_REQUIRE_EXPIRY", "0") == "1"
+
+
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    global replay_filter
+    replay_filter = ReplayFilter.from_env()
+    snapshot = os.getenv("QUOTA_SNAPSHOT_PATH")
+    if snapshot:
+        quotas.load(snapshot)
+    if replica is not None:
+        replica.start()
+    jobs.resume()
+    yield
+    jobs.stop()
+    if replica is not None:
+        replica.stop()
+    if replay_filter is not None:
+        replay_filter.close()
+        replay_filter = None
+    if snapshot:
+        quotas.save(snapshot)
+
+
+app = FastAPI(title="PoW-PVW (Local Demo)", lifespan=lifespan)
+
+
+def _header_text(text: str, limit: int = 200) -> str:
+    # One line of printable ASCII, as header values must be
+    return " ".join(text.encode("ascii", "replace").decode().split())[:limit]
+
+
+class ReplicationLagHeaders:
+    """Adds X-Replica-Lag-* and X-Replica-Error headers to replica responses.
+
+    Plain ASGI rather than ``@app.middleware``: it only rewrites the
+    ``http.response.start`` message and never touches ``receive``, so
+    streaming request bodies reach the endpoint intact.
+    """
+
+    def __init__(self, app: ASGIApp) -> None:
+        self.app = app
+
+    async def __call__(self, scope: Scope, receive: Receive, send: Send) -> None:
+        if scope["type"] != "http" or replica is None:
+            await self.app(scope, receive, send)
+            return
+
+        async def send_with_lag(message: Message) -> None:
+            if message["type"] == "http.response.start" and replica is not None:
+                lag = replica.lag()
+                headers = MutableHeaders(scope=message)
+                headers["X-Replica-Lag-Bytes"] = str(lag["bytes"])
+                headers["X-Replica-Lag-Ms"] = "unknown" if lag["ms"] is None else str(lag["ms"])
+                if lag["error"]:
+                    headers["X-Replica-Error"] = _header_text(lag["error"])
+            await send(message)
+
+        await self.app(scope, receive, send_with_lag)
+
+
+if replica is not None:
+    app.add_middleware(ReplicationLagHeaders)
+
+M = TypeVar("M", bound=BaseModel)
 
 @app.get("/") 
 def root():
     return {"ok": True, "name": "pow-pvw-demo", "endpoints": ["/issue", "/verify"]}
 
+def _require_primary() -> None:
+    if replica is not None:
+        raise HTTPException(status_code=403, detail="This node is a verify-only replica")
+
+
+def _find_issue(txid: str) -> Optional[Dict[str, Any]]:
+    if replica is not None:
+        return replica.find_commitment_by_txid(txid)
+    return ledger.find_commitment_by_txid(txid)
+
+
+def _enforce_quota(client_id: str, endpoint: str) -> None:
+    # Runs right after PoW validation, before any HKDF/embedding/ledger work
+    retry_after = quotas.hit(client_id, endpoint)
+    if retry_after is not None:
+        raise HTTPException(
+            status_code=429,
+            detail=f"Quota exceeded for {endpoint}",
+            headers={"Retry-After": str(max(1, math.ceil(retry_after)))},
+        )
+
+
+def _pow_ticket_dict(client_id: str, endpoint: str, pow: PoWTicket) -> Dict[str, Any]:
+    return {
+        "client_id": client_id,
+        "endpoint": endpoint,
+        "body_hash": pow.body_hash,
+        "nonce": pow.nonce,
+        "difficulty": pow.difficulty,
+        "expires_at": pow.expires_at,
+    }
+
+
+def _spend_ticket(ticket: Dict[str, Any]) -> None:
+    # A ticket buys one request. Runs after PoW validation, the quota check
+    # and the cheap request checks (so a rejected request keeps its ticket),
+    # and before any HKDF, detection or ledger work
+    expires_at = ticket.get("expires_at")
+    if expires_at is not None:
+        now = now_ms()
+        if expires_at <= now:
+            raise HTTPException(status_code=400, detail="PoW ticket expired")
+        if replay_filter is not None and expires_at > now + replay_filter.window_s * 1000:
+            raise HTTPException(status_code=400, detail="PoW ticket expiry is beyond the replay window")
+    elif REPLAY_REQUIRE_EXPIRY:
+        raise HTTPException(status_code=400, detail="PoW ticket must carry expires_at")
+    if replay_filter is not None and replay_filter.check_and_add(ticket_hash_hex(ticket)):
+        raise HTTPException(status_code=409, detail="PoW ticket already used")
+
+
+@app.get("/quota/{client_id}")
+def quota_usage(client_id: str):
+    return {"client_id": client_id, "usage": quotas.usage(client_id)}
+
+
 @app.post("/issue", response_model=IssueResponse)
 def issue(req: IssueRequest):
+    _require_primary()
     # Validate PoW
     body_hash = req.pow.body_hash
-    if not validate_pow(req.client_id, "/issue", body_hash, req.pow.nonce, req.pow.difficulty):
+    if not validate_pow(req.client_id, "/issue", body_hash, req.pow.nonce, req.pow.difficulty, req.pow.expires_at):
         raise HTTPException(status_code=400, detail="Invalid PoW ticket")
     # Build canonical ticket and derive seed via HKDF
-    ticket = {
-        "client_id": req.client_id,
-        "endpoint": "/issue",
-        "body_hash": body_hash,
-        "nonce": req.pow.nonce,
-        "difficulty": req.pow.difficulty,
-    }
+    ticket = _pow_ticket_dict(req.client_id, "/issue", req.pow)
+    _enforce_quota(req.client_id, "/issue")
+    _spend_ticket(ticket)
     serialized = serialize_ticket(ticket)
     server_salt = get_server_salt()
     seed = hkdf_sha256(hashlib.sha256(serialized).digest(), salt=server_salt, info=b"pov-pvw-seed", length=32)
@@ -59,12 +199,13 @@ def issue(req: IssueRequest):
 def verify(req: VerifyRequest):
     # Validate PoW
     body_hash = req.pow.body_hash
-    if not validate_pow(req.client_id, "/verify", body_hash, req.pow.nonce, req.pow.difficulty):
+    if not validate_pow(req.client_id, "/verify", body_hash, req.pow.nonce, req.pow.difficulty, req.pow.expires_at):
         raise HTTPException(status_code=400, detail="Invalid PoW ticket")
+    _enforce_quota(req.client_id, "/verify")
     # Resolve commitment
     commitment = None
     if req.evidence.txid:
-        rec = ledger.find_commitment_by_txid(req.evidence.txid)
+        rec = _find_issue(req.evidence.txid)
         if not rec:
             raise HTTPException(status_code=404, detail="Unknown txid")
         commitment = rec["commitment"]
@@ -72,6 +213,7 @@ def verify(req: VerifyRequest):
         commitment = req.evidence.commitment
     else:
         raise HTTPException(status_code=400, detail="Provide evidence.commitment or evidence.txid")
+    _spend_ticket(_pow_ticket_dict(req.client_id, "/verify", req.pow))
     # Detect (legacy): server_salt used as legacy secret parameter
     server_salt = get_server_salt()
     det = detect_text(req.content, commitment, server_salt)
@@ -92,55 +234,81 @@ def verify(req: VerifyRequest):
     return VerifyResponse(decision=decision, statistic=det["statistic"], pvalue=det["pvalue"], transcript_sig=sig, txid=txid)
 
 
-@app.post("/issue_v2", response_model=IssueV2Response)
-def issue_v2(req: IssueV2Request):
-    # Validate PoW using the ticket (the ticket contains difficulty & nonce bound to content hash)
-    t = req.ticket
-    if not validate_pow(t.client_id, t.endpoint, t.body_hash, str(t.nonce), int(t.difficulty)):
-        raise HTTPException(status_code=400, detail="Invalid PoW ticket")
-
-    # Derive seed from canonical ticket via HKDF
-    tdict = {
+def _ticket_dict(t: Ticket) -> Dict[str, Any]:
+    return {
         "client_id": t.client_id,
         "endpoint": t.endpoint,
         "body_hash": t.body_hash,
         "nonce": t.nonce,
         "difficulty": t.difficulty,
+        "expires_at": t.expires_at,
     }
-    serialized = serialize_ticket(tdict)
-    server_salt = get_server_salt()
-    seed = hkdf_sha256(hashlib.sha256(serialized).digest(), salt=server_salt, info=b"pov-pvw-seed", length=32)
 
-    # Embed deterministically from seed
-    watermarked, _tag = embed_with_key(req.content, seed)
 
-    # Compute commitment and ticket hash
-    commitment = sha256_hex(seed + server_salt)
+def _check_issue_ticket(t: Ticket) -> Dict[str, Any]:
+    _require_primary()
+    # Validate PoW using the ticket (the ticket contains difficulty & nonce bound to content hash)
+    if not validate_pow(t.client_id, t.endpoint, t.body_hash, str(t.nonce), int(t.difficulty), t.expires_at):
+        raise HTTPException(status_code=400, detail="Invalid PoW ticket")
+    tdict = _ticket_dict(t)
+    _enforce_quota(t.client_id, "/issue")
+    _spend_ticket(tdict)
+    return tdict
+
+
+def _record_issue(
+    tdict: Dict[str, Any], commitment: str, model_id: str, output_hash: str, stream_id: Optional[str] = None
+) -> Tuple[Dict[str, Any], str]:
+    """Append the ledger issue record and return the signed receipt."""
     t_hash = ticket_hash_hex(tdict)
 
     # Append ledger issue record (sign the record as well)
     record = {
         "type": "issue",
         "ts": now_ms(),
-        "client_id": t.client_id,
-        "model_id": req.metadata.get("model_id", "demo"),
+        "client_id": tdict["client_id"],
+        "model_id": model_id,
         "commitment": commitment,
         "ticket_hash": t_hash,
-        "output_hash": sha256_hex(watermarked.encode()),
+        "output_hash": output_hash,
         "policy_v": 1,
     }
+    if stream_id is not None:
+        record["stream_id"] = stream_id
     rec_sig = hmac_sign(record)
     record["sig"] = rec_sig
     txid = ledger.append_record(record)
 
     # Build receipt and sign it
-    receipt_obj = {
-        "commitment": commitment,
-        "txid": txid,
-        "ticket_hash": t_hash,
-        "timestamp": record["ts"],
+    receipt_obj = _receipt_from_record({**record, "txid": txid})
+    return receipt_obj, hmac_sign(receipt_obj)
+
+
+def _receipt_from_record(rec: Dict[str, Any]) -> Dict[str, Any]:
+    """Receipt fields of a ledger issue record."""
+    return {
+        "commitment": rec["commitment"],
+        "txid": rec["txid"],
+        "ticket_hash": rec["ticket_hash"],
+        "timestamp": rec["ts"],
     }
-    sig = hmac_sign(receipt_obj)
+
+
+@app.post("/issue_v2", response_model=IssueV2Response)
+def issue_v2(req: IssueV2Request):
+    tdict = _check_issue_ticket(req.ticket)
+
+    # Derive seed from canonical ticket via HKDF
+    server_salt = get_server_salt()
+    seed = derive_seed(tdict, server_salt)
+
+    # Embed deterministically from seed
+    watermarked, _tag = embed_with_key(req.content, seed)
+
+    commitment = sha256_hex(seed + server_salt)
+    receipt_obj, sig = _record_issue(
+        tdict, commitment, req.metadata.get("model_id", "demo"), sha256_hex(watermarked.encode())
+    )
 
     return IssueV2Response(
         watermarked=watermarked,
@@ -149,52 +317,56 @@ def issue_v2(req: IssueV2Request):
     )
 
 
-@app.post("/verify_v2", response_model=VerifyV2Response)
-def verify_v2(req: VerifyV2Request):
+def _verify_v2(
+    content: Union[str, bytes],
+    client_id: str,
+    ticket: Optional[Ticket],
+    evidence: Optional[EvidenceV2],
+    pow: Optional[PoWTicket],
+) -> VerifyV2Response:
     # Validate PoW if provided (recommended)
-    if req.pow is not None:
-        if not validate_pow(req.client_id, "/verify", req.pow.body_hash, req.pow.nonce, req.pow.difficulty):
+    if pow is not None:
+        if not validate_pow(client_id, "/verify", pow.body_hash, pow.nonce, pow.difficulty, pow.expires_at):
             raise HTTPException(status_code=400, detail="Invalid PoW ticket")
+    _enforce_quota(client_id, "/verify")
+
+    # Resolve evidence first so a request rejected here keeps its PoW ticket
+    commitment = None
+    if ticket is None:
+        if evidence is None or not (evidence.txid or evidence.commitment):
+            raise HTTPException(status_code=400, detail="Provide either 'ticket' or 'evidence' with 'commitment' or 'txid'")
+        if evidence.txid:
+            rec = _find_issue(evidence.txid)
+            if not rec:
+                raise HTTPException(status_code=404, detail="Unknown txid")
+            commitment = rec["commitment"]
+        else:
+            commitment = evidence.commitment
+    if pow is not None:
+        _spend_ticket(_pow_ticket_dict(client_id, "/verify", pow))
 
     server_salt = get_server_salt()
     ticket_hash = None
-    commitment = None
 
-    if req.ticket is not None:
-        tdict = {
-            "client_id": req.ticket.client_id,
-            "endpoint": req.ticket.endpoint,
-            "body_hash": req.ticket.body_hash,
-            "nonce": req.ticket.nonce,
-            "difficulty": req.ticket.difficulty,
-        }
-        serialized = serialize_ticket(tdict)
-        seed = hkdf_sha256(hashlib.sha256(serialized).digest(), salt=server_salt, info=b"pov-pvw-seed", length=32)
-        det = detect_with_key(req.content, seed)
+    if ticket is not None:
+        tdict = _ticket_dict(ticket)
+        seed = derive_seed(tdict, server_salt)
+        det = detect_with_key(content, seed)
         commitment = sha256_hex(seed + server_salt)
         ticket_hash = ticket_hash_hex(tdict)
         decision = det["present"]
-    elif req.evidence is not None and (req.evidence.txid or req.evidence.commitment):
+    else:
         # Legacy-style verification without seed (weaker): use pattern presence
-        if req.evidence.txid:
-            rec = ledger.find_commitment_by_txid(req.evidence.txid)
-            if not rec:
-                raise HTTPException(status_code=404, detail="Unknown txid")
-            commitment = rec["commitment"]
-        else:
-            commitment = req.evidence.commitment  # type: ignore[assignment]
-        legacy = detect_text(req.content, commitment, server_salt)
+        legacy = detect_text(content, commitment, server_salt)
         det = {"statistic": legacy["statistic"], "pvalue": legacy["pvalue"], "present": legacy["statistic"] >= 1.0 and legacy["pvalue"] <= 0.05}
         decision = det["present"]
-    else:
-        raise HTTPException(status_code=400, detail="Provide either 'ticket' or 'evidence' with 'commitment' or 'txid'")
 
     transcript = {
         "type": "verify",
         "ts": now_ms(),
-        "client_id": req.client_id,
+        "client_id": client_id,
         "commitment": commitment,
-        "content_hash": sha256_hex(req.content.encode()),
+        "content_hash": sha256_hex(content if isinstance(content, bytes) else content.encode()),
         "statistic": det["statistic"],
         "pvalue": det["pvalue"],
         "decision": decision,
@@ -212,3 +384,355 @@ def verify_v2(req: VerifyV2Request):
         sig=sig,
         txid=txid,
     )
+
+
+@app.post("/verify_v2", response_model=VerifyV2Response)
+def verify_v2(req: VerifyV2Request):
+    return _verify_v2(req.content, req.client_id, req.ticket, req.evidence, req.pow)
+
+
+# --------------------
+# Raw-body variants: content travels as the request body (no JSON escaping or
+# Pydantic validation of a large string); the ticket and other small fields
+# travel in headers.
+# --------------------
+
+RAW_MEDIA_TYPES = ("application/octet-stream", "text/plain")
+
+
+def _require_raw_body(request: Request) -> None:
+    media_type = request.headers.get("content-type", "").split(";", 1)[0].strip().lower()
+    if media_type not in RAW_MEDIA_TYPES:
+        raise HTTPException(status_code=415, detail=f"Content-Type must be one of {', '.join(RAW_MEDIA_TYPES)}")
+
+
+def _header_model(request: Request, name: str, model: Type[M]) -> Optional[M]:
+    """Parse a small JSON object carried in header ``name`` into ``model``."""
+    raw = request.headers.get(name)
+    if raw is None:
+        return None
+    try:
+        return model.model_validate_json(raw)
+    except ValidationError as e:
+        raise HTTPException(status_code=400, detail=f"Invalid {name} header: {e.errors()[0]['msg']}")
+
+
+@app.post("/issue_v2/raw")
+async def issue_v2_raw(request: Request):
+    """Raw-body /issue_v2.
+
+    Request body: the content bytes. Headers: ``X-Ticket`` (Ticket JSON),
+    optional ``X-Model-Id``. Response body: the watermarked bytes; the signed
+    receipt is returned in ``X-Receipt-*`` headers.
+    """
+    _require_raw_body(request)
+    ticket = _header_model(request, "X-Ticket", Ticket)
+    if ticket is None:
+        raise HTTPException(status_code=400, detail="Missing X-Ticket header")
+    tdict = _check_issue_ticket(ticket)
+    body = await request.body()
+
+    server_salt = get_server_salt()
+    seed = derive_seed(tdict, server_salt)
+    suffix, _tag = watermark_suffix(seed)
+    suffix_b = suffix.encode()
+
+    # Hash body and suffix in place rather than materializing body + suffix
+    h = hashlib.sha256(body)
+    h.update(suffix_b)
+
+    commitment = sha256_hex(seed + server_salt)
+    receipt_obj, sig = _record_issue(tdict, commitment, request.headers.get("X-Model-Id", "demo"), h.hexdigest())
+
+    headers = {
+        "Content-Length": str(len(body) + len(suffix_b)),
+        "X-Receipt-Commitment": receipt_obj["commitment"],
+        "X-Receipt-Txid": receipt_obj["txid"],
+        "X-Receipt-Ticket-Hash": receipt_obj["ticket_hash"],
+        "X-Receipt-Timestamp": str(receipt_obj["timestamp"]),
+        "X-Receipt-Sig": sig,
+    }
+    return StreamingResponse(iter((body, suffix_b)), media_type="application/octet-stream", headers=headers)
+
+
+@app.post("/verify_v2/raw", response_model=VerifyV2Response)
+async def verify_v2_raw(request: Request):
+    """Raw-body /verify_v2.
+
+    Request body: the content bytes. Headers: ``X-Client-Id`` and either
+    ``X-Ticket`` (Ticket JSON) or ``X-Evidence`` (EvidenceV2 JSON); optional
+    ``X-PoW`` (PoWTicket JSON).
+    """
+    _require_raw_body(request)
+    client_id = request.headers.get("X-Client-Id")
+    if not client_id:
+        raise HTTPException(status_code=400, detail="Missing X-Client-Id header")
+    ticket = _header_model(request, "X-Ticket", Ticket)
+    evidence = _header_model(request, "X-Evidence", EvidenceV2)
+    pow = _header_model(request, "X-PoW", PoWTicket)
+    body = await request.body()
+    return _verify_v2(body, client_id, ticket, evidence, pow)
+
+
+@app.post("/verify_v2/exact", response_model=ExactMatchResponse)
+async def verify_v2_exact(request: Request, output_hash: Optional[str] = Query(None, pattern="^[0-9a-f]{64}$")):
+    """Exact-match verification: was this exact output issued?
+
+    Request body: the content bytes, hashed chunk by chunk as they arrive
+    (never buffered); or pass ``?output_hash=<sha256 hex>`` with no body.
+    Headers: ``X-Client-Id``, optional ``X-PoW``. One index lookup, no
+    detection and no ledger append; the answer is HMAC-signed. A miss only
+    means the content is not a byte-identical copy of an issued output, so
+    fall back to ``/verify_v2`` for edited content.
+    """
+    client_id = request.headers.get("X-Client-Id")
+    if not client_id:
+        raise HTTPException(status_code=400, detail="Missing X-Client-Id header")
+    pow = _header_model(request, "X-PoW", PoWTicket)
+    if pow is not None:
+        if not validate_pow(client_id, "/verify", pow.body_hash, pow.nonce, pow.difficulty, pow.expires_at):
+            raise HTTPException(status_code=400, detail="Invalid PoW ticket")
+    _enforce_quota(client_id, "/verify")
+    if output_hash is None:
+        _require_raw_body(request)
+    if pow is not None:
+        _spend_ticket(_pow_ticket_dict(client_id, "/verify", pow))
+
+    if output_hash is None:
+        h = hashlib.sha256()
+        async for chunk in request.stream():
+            h.update(chunk)
+        output_hash = h.hexdigest()
+
+    if replica is not None:
+        rec = replica.find_issue_by_output_hash(output_hash)
+    else:
+        rec = ledger.find_issue_by_output_hash(output_hash)
+    receipt = _receipt_from_record(rec) if rec is not None else None
+    answer = {"match": rec is not None, "output_hash": output_hash, "receipt": receipt, "ts": now_ms()}
+    return ExactMatchResponse(**answer, sig=hmac_sign(answer))
+
+
+# --------------------
+# Streaming issuance: the body is watermarked and hashed chunk by chunk while
+# it is relayed back, so memory stays flat regardless of output size. The
+# receipt only exists once the stream ends; it is fetched from the URL given
+# in X-Receipt-Location, which is keyed by a stream id minted per request and
+# stored in the issue record, so any worker (or replica) can rebuild it from
+# the ledger. The commitment alone would not do: it depends only on the ticket.
+# --------------------
+
+
+class _PassThroughResponse(StreamingResponse):
+    """StreamingResponse that leaves ``receive`` to the request body.
+
+    Starlette's StreamingResponse concurrently listens for disconnects on
+    ``receive``, which would swallow request chunks that are still being read.
+    """
+
+    async def __call__(self, scope, receive, send) -> None:
+        await self.stream_response(send)
+        if self.background is not None:
+            await self.background()
+
+
+@app.post("/issue_v2/stream")
+async def issue_v2_stream(request: Request):
+    """Streaming /issue_v2.
+
+    Request body: the content, optionally chunked. Headers: ``X-Ticket``
+    (Ticket JSON), optional ``X-Model-Id``. The response body streams the
+    watermarked bytes; ``X-Receipt-Commitment``, ``X-Receipt-Ticket-Hash``
+    and ``X-Receipt-Stream-Id`` are known up front, the signed receipt is at
+    ``X-Receipt-Location`` once the stream has completed.
+    """
+    _require_raw_body(request)
+    ticket = _header_model(request, "X-Ticket", Ticket)
+    if ticket is None:
+        raise HTTPException(status_code=400, detail="Missing X-Ticket header")
+    tdict = _check_issue_ticket(ticket)
+    model_id = request.headers.get("X-Model-Id", "demo")
+
+    server_salt = get_server_salt()
+    seed = derive_seed(tdict, server_salt)
+    commitment = sha256_hex(seed + server_salt)
+    stream_id = secrets.token_hex(16)
+
+    async def relay():
+        h = hashlib.sha256()
+        async for chunk in embed_stream(request.stream(), seed):
+            h.update(chunk)
+            yield chunk
+        # Stream complete: append the ledger record the receipt is built from
+        await run_in_threadpool(_record_issue, tdict, commitment, model_id, h.hexdigest(), stream_id)
+
+    headers = {
+        "X-Receipt-Commitment": commitment,
+        "X-Receipt-Ticket-Hash": ticket_hash_hex(tdict),
+        "X-Receipt-Stream-Id": stream_id,
+        "X-Receipt-Location": f"/issue_v2/stream/{stream_id}/receipt",
+    }
+    return _PassThroughResponse(relay(), media_type="application/octet-stream", headers=headers)
+
+
+@app.get("/issue_v2/stream/{stream_id}/receipt", response_model=StreamReceipt)
+def issue_v2_stream_receipt(stream_id: str):
+    if replica is not None:
+        rec = replica.find_issue_by_stream_id(stream_id)
+    else:
+        rec = ledger.find_issue_by_stream_id(stream_id)
+    if rec is None:
+        raise HTTPException(status_code=404, detail="Unknown or unfinished stream")
+    # Receipts are deterministic in the record, so this is the receipt signed at issuance
+    receipt_obj = _receipt_from_record(rec)
+    return StreamReceipt(receipt=Receipt(**receipt_obj), sig=hmac_sign(receipt_obj))
+
+
+# --------------------
+# Ledger change feed and lookups. The primary serves its ledger bytes from an
+# offset so verify-only replicas can tail them; the feed holds every tenant's
+# records, so it is only served to holders of LEDGER_FEED_TOKEN. Lookups return
+# the public receipt fields only and are answered from the replica's index
+# when this node is a replica.
+# --------------------
+
+FEED_MAX_WAIT_S = 30.0
+
+
+def _require_feed_token(request: Request) -> None:
+    token = os.getenv("LEDGER_FEED_TOKEN")
+    if not token:
+        raise HTTPException(status_code=404, detail="Ledger feed is disabled")
+    given = request.headers.get(FEED_TOKEN_HEADER, "")
+    if not hmac.compare_digest(given.encode(), token.encode()):
+        raise HTTPException(status_code=403, detail="Invalid ledger feed token")
+
+
+@app.get("/ledger/feed")
+async def ledger_feed(
+    request: Request,
+    offset: int = Query(0, ge=0),
+    wait: float = Query(0.0, ge=0.0),
+    max_bytes: int = Query(ledger.FEED_MAX_BYTES, ge=1, le=ledger.FEED_MAX_BYTES),
+    shard: int = Query(0, ge=0),
+    epoch: Optional[str] = Query(None),
+):
+    """Whole ledger records of one shard from byte ``offset`` as NDJSON.
+
+    With ``wait`` > 0 the call long-polls until new records exist. Headers
+    carry ``X-Ledger-Offset``, ``X-Ledger-Next-Offset`` (pass it as the next
+    ``offset``), ``X-Ledger-Size``, ``X-Ledger-Shards`` and ``X-Ledger-Epoch``.
+    Offsets are only valid within an epoch: when ``epoch`` is given and is no
+    longer current (the ledger was rebalanced), the response is empty and the
+    caller must start again from offset 0 of every shard. Requires the
+    ``X-Ledger-Feed-Token`` header to match ``LEDGER_FEED_TOKEN``.
+    """
+    _require_primary()
+    _require_feed_token(request)
+    shard_count = len(ledger.shards())
+    current_epoch = ledger.epoch()
+    if epoch is not None and epoch != current_epoch:
+        headers = {
+            "X-Ledger-Offset": str(offset),
+            "X-Ledger-Next-Offset": "0",
+            "X-Ledger-Shards": str(shard_count),
+            "X-Ledger-Epoch": current_epoch,
+        }
+        return Response(content=b"", media_type="application/x-ndjson", headers=headers)
+    if shard >= shard_count:
+        raise HTTPException(status_code=404, detail="Unknown shard")
+    if offset > ledger.ledger_size(shard):
+        raise HTTPException(status_code=416, detail="Offset beyond end of ledger")
+    deadline = asyncio.get_running_loop().time() + min(wait, FEED_MAX_WAIT_S)
+    data, next_offset = await run_in_threadpool(ledger.read_feed, offset, max_bytes, shard)
+    while not data and asyncio.get_running_loop().time() < deadline:
+        await asyncio.sleep(0.1)
+        data, next_offset = await run_in_threadpool(ledger.read_feed, offset, max_bytes, shard)
+    headers = {
+        "X-Ledger-Offset": str(offset),
+        "X-Ledger-Next-Offset": str(next_offset),
+        "X-Ledger-Size": str(ledger.ledger_size(shard)),
+        "X-Ledger-Shards": str(shard_count),
+        "X-Ledger-Epoch": current_epoch,
+    }
+    return Response(content=data, media_type="application/x-ndjson", headers=headers)
+
+
+@app.get("/ledger/txid/{txid}", response_model=Receipt)
+def ledger_txid(txid: str):
+    rec = _find_issue(txid)
+    if not rec:
+        raise HTTPException(status_code=404, detail="Unknown txid")
+    return _receipt_from_record(rec)
+
+
+@app.get("/ledger/commitment/{commitment}", response_model=Receipt)
+def ledger_commitment(commitment: str):
+    if replica is not None:
+        rec = replica.find_issue_by_commitment(commitment)
+    else:
+        rec = ledger.find_issue_by_commitment(commitment)
+    if not rec:
+        raise HTTPException(status_code=404, detail="Unknown commitment")
+    return _receipt_from_record(rec)
+
+
+# --------------------
+# Bulk verification jobs over server-side corpora (see app/jobs.py)
+# --------------------
+
+@app.post("/jobs/verify", status_code=202)
+def submit_verify_job(req: BulkVerifyRequest):
+    if req.pow is not None:
+        if not validate_pow(req.client_id, "/verify", req.pow.body_hash, req.pow.nonce, req.pow.difficulty, req.pow.expires_at):
+            raise HTTPException(status_code=400, detail="Invalid PoW ticket")
+    _enforce_quota(req.client_id, "/verify")
+    root = source_root()
+    source = resolve_within(req.source, root)
+    if source is None or not os.path.exists(source):
+        raise HTTPException(status_code=400, detail="Unknown source path")
+    fmt = req.format or ("dir" if os.path.isdir(source) else "ndjson")
+    if (fmt == "dir") != os.path.isdir(source):
+        raise HTTPException(status_code=400, detail=f"Source is not a valid '{fmt}' source")
+    if req.pow is not None:
+        _spend_ticket(_pow_ticket_dict(req.client_id, "/verify", req.pow))
+    evidence: Dict[str, Any] = {}
+    if req.ticket is not None:
+        evidence["ticket"] = _ticket_dict(req.ticket)
+    elif req.evidence is not None:
+        evidence = req.evidence.model_dump(exclude_none=True)
+    job_id = jobs.submit({
+        "source": source,
+        "root": root,
+        "format": fmt,
+        "client_id": req.client_id,
+        "evidence": evidence,
+        "transcripts": req.transcripts,
+        "batch_size": req.batch_size,
+    })
+    return jobs.status(job_id)
+
+
+@app.get("/jobs/{job_id}")
+def job_status(job_id: str):
+    state = jobs.status(job_id)
+    if state is None:
+        raise HTTPException(status_code=404, detail="Unknown job")
+    return state
+
+
+@app.post("/jobs/{job_id}/retry")
+def retry_job(job_id: str):
+    state = jobs.status(job_id)
+    if state is None:
+        raise HTTPException(status_code=404, detail="Unknown job")
+    if state["status"] != "failed":
+        raise HTTPException(status_code=409, detail=f"Job is {state['status']}, not failed")
+    return jobs.retry(job_id)
+
+
+@app.get("/jobs/{job_id}/results")
+def job_results(job_id: str):
+    if jobs.status(job_id) is None or not os.path.exists(jobs.results_path(job_id)):
+        raise HTTPException(status_code=404, detail="Unknown job")
+    return FileResponse(jobs.results_path(job_id), media_type="application/x-ndjson")
@@ -1,10 +1,11 @@
 from pydantic import BaseModel, Field
-from typing import Optional, Dict, Any, Union
+from typing import Optional, Dict, Any, Literal, Union
 
 class PoWTicket(BaseModel):
     body_hash: str
     nonce: str
     difficulty: int
+    expires_at: Optional[int] = None  # ms since epoch; bound into the PoW
 
 class IssueRequest(BaseModel):
     text: str
@@ -47,6 +48,7 @@ class Ticket(BaseModel):
     body_hash: str
     nonce: Union[str, int]
     difficulty: int
+    expires_at: Optional[int] = None  # ms since epoch; bound into the PoW
 
 
 class Receipt(BaseModel):
@@ -68,6 +70,11 @@ class IssueV2Response(BaseModel):
     sig: str
 
 
+class StreamReceipt(BaseModel):
+    receipt: Receipt
+    sig: str
+
+
 class EvidenceV2(BaseModel):
     commitment: Optional[str] = None
     txid: Optional[str] = None
@@ -92,3 +99,23 @@ class VerifyV2Response(BaseModel):
     transcript: Dict[str, Any]
     sig: str
     txid: str
+
+
+class ExactMatchResponse(BaseModel):
+    match: bool
+    output_hash: str
+    receipt: Optional[Receipt] = None  # the original issuance when matched
+    ts: int
+    sig: str
+
+
+class BulkVerifyRequest(BaseModel):
+    source: str
+    format: Optional[Literal["ndjson", "dir"]] = None
+    client_id: str
+    # Job-level evidence for documents that carry none of their own
+    ticket: Optional[Ticket] = None
+    evidence: Optional[EvidenceV2] = None
+    transcripts: bool = False
+    batch_size: int = Field(default=256, ge=1, le=10_000)
+    pow: Optional[PoWTicket] = None
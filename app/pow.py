@@ -1,8 +1,13 @@
-from typing import Dict, Any
-from .utils import sha256_hex, leading_zeros_bits, canonical_json
-
-def validate_pow(client_id: str, endpoint: str, body_hash: str, nonce: str, difficulty: int)->bool:
-    material = f"{client_id}|{endpoint}|{body_hash}|{nonce}".encode()
+import hashlib
+from typing import Dict, Any, Optional
+from .utils import sha256_hex, leading_zeros_bits, canonical_json, hkdf_sha256
+
+def validate_pow(client_id: str, endpoint: str, body_hash: str, nonce: str, difficulty: int, expires_at: Optional[int] = None)->bool:
+    material = f"{client_id}|{endpoint}|{body_hash}|{nonce}"
+    if expires_at is not None:
+        # Expiring tickets bind the expiry into the PoW so it cannot be extended
+        material += f"|{int(expires_at)}"
+    material = material.encode()
     h = sha256_hex(material)
     return leading_zeros_bits(h) >= difficulty
 
@@ -10,7 +15,9 @@ def validate_pow(client_id: str, endpoint: str, body_hash: str, nonce: str, diff
 def serialize_ticket(ticket: Dict[str, Any]) -> bytes:
     """Canonical serialization of a PoW ticket for hashing and HKDF input.
 
-    Expected keys: client_id, endpoint, body_hash, nonce, difficulty.
+    Expected keys: client_id, endpoint, body_hash, nonce, difficulty; an
+    optional expires_at (ms) is included only when set, so tickets without
+    one keep their hash and seed.
     """
     # Normalize fields to stable types
     normalized = {
@@ -20,6 +27,8 @@ def serialize_ticket(ticket: Dict[str, Any]) -> bytes:
         "nonce": str(ticket["nonce"]),
         "difficulty": int(ticket["difficulty"]),
     }
+    if ticket.get("expires_at") is not None:
+        normalized["expires_at"] = int(ticket["expires_at"])
     return canonical_json(normalized)
 
 
@@ -28,6 +37,12 @@ def ticket_hash_hex(ticket: Dict[str, Any]) -> str:
     return sha256_hex(serialize_ticket(ticket))
 
 
+def derive_seed(ticket: Dict[str, Any], server_salt: bytes) -> bytes:
+    """Watermark seed for a ticket: HKDF-SHA256 over the canonical ticket hash."""
+    ikm = hashlib.sha256(serialize_ticket(ticket)).digest()
+    return hkdf_sha256(ikm, salt=server_salt, info=b"pov-pvw-seed", length=32)
+
+
 def validate_pow_ticket(ticket: Dict[str, Any]) -> bool:
     """Validate PoW from a ticket dict (compat with validate_pow())."""
     return validate_pow(
@@ -36,4 +51,5 @@ def validate_pow_ticket(ticket: Dict[str, Any]) -> bool:
         str(ticket["body_hash"]),
         str(ticket["nonce"]),
         int(ticket["difficulty"]),
+        ticket.get("expires_at"),
     )
@@ -0,0 +1,231 @@
+"""Per-client quota accounting.
+
+Approximate sliding-window counters per (client_id, endpoint), kept in memory
+with LRU eviction of idle clients and an optional JSON snapshot so quotas
+survive restarts.
+
+Counters are per process: with several server workers, each enforces the
+limits on the requests it serves, so a client can make up to ``limit`` x
+workers requests per window. All workers share one snapshot file; each save
+merges into it rather than replacing it.
+
+Each client costs one small ``array('q')``: ``[last_seen, window_idx,
+cur_0, prev_0, cur_1, prev_1, ...]`` with one (cur, prev) pair per endpoint.
+The sliding count is estimated as ``cur + prev * (1 - elapsed_fraction)``.
+"""
+
+import json
+import math
+import os
+import threading
+import time
+from array import array
+from collections import OrderedDict
+from contextlib import contextmanager
+from typing import Any, Callable, Dict, Iterator, List, Optional
+
+try:
+    import fcntl
+except ImportError:  # Windows: saves are not serialized across processes
+    fcntl = None  # type: ignore
+
+# Header slots in each entry before the per-endpoint (cur, prev) pairs
+_LAST_SEEN = 0
+_WINDOW = 1
+_HEADER = 2
+
+
+class QuotaTracker:
+    """Sliding-window request quotas keyed by client_id and endpoint.
+
+    ``limits`` maps endpoint -> max requests per ``window_s``; a limit <= 0
+    disables the quota for that endpoint. Clients idle for two windows carry
+    no state worth keeping and are evicted, as are the least recently seen
+    clients once ``max_clients`` is exceeded.
+    """
+
+    def __init__(
+        self,
+        limits: Dict[str, int],
+        window_s: float = 60.0,
+        max_clients: int = 500_000,
+        clock: Callable[[], float] = time.time,
+    ):
+        self.limits = dict(limits)
+        self.window_s = float(window_s)
+        self.max_clients = max_clients
+        self._slots = {ep: _HEADER + 2 * i for i, ep in enumerate(self.limits)}
+        self._width = _HEADER + 2 * len(self.limits)
+        self._clock = clock
+        self._lock = threading.Lock()
+        self._entries: "OrderedDict[str, array]" = OrderedDict()
+
+    @classmethod
+    def from_env(cls) -> "QuotaTracker":
+        """Build from QUOTA_WINDOW_S, QUOTA_ISSUE_LIMIT, QUOTA_VERIFY_LIMIT, QUOTA_MAX_CLIENTS."""
+        return cls(
+            limits={
+                "/issue": int(os.getenv("QUOTA_ISSUE_LIMIT", "60")),
+                "/verify": int(os.getenv("QUOTA_VERIFY_LIMIT", "1200")),
+            },
+            window_s=float(os.getenv("QUOTA_WINDOW_S", "60")),
+            max_clients=int(os.getenv("QUOTA_MAX_CLIENTS", "500000")),
+        )
+
+    def __len__(self) -> int:
+        return len(self._entries)
+
+    def _roll(self, entry: array, window: int) -> None:
+        # Shift counters so entry[_WINDOW] == window
+        if entry[_WINDOW] == window:
+            return
+        adjacent = entry[_WINDOW] == window - 1
+        for slot in range(_HEADER, self._width, 2):
+            entry[slot + 1] = entry[slot] if adjacent else 0
+            entry[slot] = 0
+        entry[_WINDOW] = window
+
+    def _evict(self, now: float) -> None:
+        idle_before = now - 2 * self.window_s
+        while self._entries:
+            client_id, entry = next(iter(self._entries.items()))
+            if entry[_LAST_SEEN] >= idle_before and len(self._entries) <= self.max_clients:
+                break
+            del self._entries[client_id]
+
+    def hit(self, client_id: str, endpoint: str) -> Optional[float]:
+        """Count one request against the client's quota.
+
+        Returns None when the request is allowed, otherwise the number of
+        seconds until it would be (the request is not counted).
+        """
+        limit = self.limits.get(endpoint, 0)
+        if limit <= 0:
+            return None
+        slot = self._slots[endpoint]
+        now = self._clock()
+        window, elapsed = divmod(now, self.window_s)
+        frac = elapsed / self.window_s
+
+        with self._lock:
+            entry = self._entries.get(client_id)
+            if entry is None:
+                entry = array("q", bytes(8 * self._width))
+                self._entries[client_id] = entry
+            else:
+                self._entries.move_to_end(client_id)
+            self._roll(entry, int(window))
+            entry[_LAST_SEEN] = int(now)
+            cur, prev = entry[slot], entry[slot + 1]
+            if cur + prev * (1.0 - frac) < limit:
+                entry[slot] += 1
+                retry_after = None
+            elif cur < limit:
+                # Wait for the previous window's share to decay enough
+                retry_after = ((1.0 - (limit - cur) / prev) - frac) * self.window_s
+            else:
+                # Wait into the next window, where this window becomes "prev"
+                retry_after = (1.0 - frac + 1.0 - limit / cur) * self.window_s
+            self._evict(now)
+        return None if retry_after is None else max(retry_after, 0.0)
+
+    def usage(self, client_id: str) -> Dict[str, Dict[str, Any]]:
+        """Current estimated usage per endpoint for ``client_id``."""
+        now = self._clock()
+        window, elapsed = divmod(now, self.window_s)
+        frac = elapsed / self.window_s
+        out: Dict[str, Dict[str, Any]] = {}
+        with self._lock:
+            entry = self._entries.get(client_id)
+            snapshot = array("q", entry) if entry is not None else None
+        if snapshot is not None:
+            self._roll(snapshot, int(window))
+        for endpoint, slot in self._slots.items():
+            limit = self.limits[endpoint]
+            used = 0.0 if snapshot is None else snapshot[slot] + snapshot[slot + 1] * (1.0 - frac)
+            used = math.ceil(used)
+            out[endpoint] = {
+                "used": used,
+                "limit": limit,
+                "remaining": max(limit - used, 0) if limit > 0 else None,
+                "window_s": self.window_s,
+            }
+        return out
+
+    def reset(self) -> None:
+        with self._lock:
+            self._entries.clear()
+
+    # --- Snapshots ---
+    def _read_snapshot(self, path: str) -> Dict[str, List[int]]:
+        """Entries of the snapshot at ``path`` (empty if missing or incompatible)."""
+        if not os.path.exists(path):
+            return {}
+        with open(path, "r", encoding="utf-8") as f:
+            data = json.load(f)
+        if data.get("window_s") != self.window_s or data.get("endpoints") != list(self._slots):
+            return {}
+        return {cid: values for cid, values in data["entries"].items() if len(values) == self._width}
+
+    def _merge(self, a: array, b: array) -> array:
+        # Same client saved by two workers: keep the higher count of each
+        window = max(a[_WINDOW], b[_WINDOW])
+        self._roll(a, window)
+        self._roll(b, window)
+        return array("q", (max(x, y) for x, y in zip(a, b)))
+
+    def save(self, path: str) -> None:
+        """Atomically merge all live entries into the snapshot at ``path``.
+
+        Every worker saves to the same file at shutdown. Saves are serialized
+        with ``flock`` on ``<path>.lock`` and write through a per-process
+        temporary file; clients already in the snapshot are kept, and a
+        client in both keeps the higher of the two counts.
+        """
+        with self._lock:
+            ours = {cid: array("q", entry) for cid, entry in self._entries.items()}
+        os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+        idle_before = self._clock() - 2 * self.window_s
+        with _file_lock(f"{path}.lock"):
+            merged = {cid: array("q", values) for cid, values in self._read_snapshot(path).items()}
+            for cid, entry in ours.items():
+                merged[cid] = self._merge(merged[cid], entry) if cid in merged else entry
+            # LRU order, as load() expects
+            live = sorted((e[_LAST_SEEN], cid) for cid, e in merged.items() if e[_LAST_SEEN] >= idle_before)
+            entries = {cid: merged[cid].tolist() for _, cid in live[-self.max_clients:]}
+            data = {"window_s": self.window_s, "endpoints": list(self._slots), "entries": entries}
+            tmp = f"{path}.{os.getpid()}.tmp"
+            with open(tmp, "w", encoding="utf-8") as f:
+                json.dump(data, f, separators=(",", ":"))
+            os.replace(tmp, path)
+
+    def load(self, path: str) -> int:
+        """Restore entries from a snapshot written by :meth:`save`.
+
+        Snapshots taken with a different window or endpoint set are ignored.
+        Returns the number of clients restored.
+        """
+        entries = self._read_snapshot(path)
+        idle_before = self._clock() - 2 * self.window_s
+        with self._lock:
+            # Snapshot order is LRU order; keep it so eviction stays correct
+            for cid, values in entries.items():
+                if values[_LAST_SEEN] >= idle_before:
+                    self._entries[cid] = array("q", values)
+                    self._entries.move_to_end(cid)
+            while len(self._entries) > self.max_clients:
+                self._entries.popitem(last=False)
+        return len(self._entries)
+
+
+@contextmanager
+def _file_lock(path: str) -> Iterator[None]:
+    if fcntl is None:
+        yield
+        return
+    with open(path, "a+b") as lf:
+        fcntl.flock(lf.fileno(), fcntl.LOCK_EX)
+        try:
+            yield
+        finally:
+            fcntl.flock(lf.fileno(), fcntl.LOCK_UN)
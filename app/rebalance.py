@@ -0,0 +1,114 @@
+"""Offline ledger rebalancing.
+
+Rewrites every existing ledger file (the single-file ledger and/or the
+current shard files) into a new shard count, routing each record by its
+client's routing bucket. Records from all sources are merged in timestamp
+order. txids are unchanged, so txids handed out earlier still resolve. The
+old files are kept beside the new ones with an ``.old-<ts>`` suffix, and a
+new ledger epoch is written so replicas know their byte offsets are void.
+
+Run it with the service stopped, then restart with ``LEDGER_SHARDS`` set to
+the new count::
+
+    python -m app.rebalance --shards 8
+"""
+
+import argparse
+import glob
+import heapq
+import json
+import os
+import shutil
+import sys
+from typing import Any, Dict, Iterator, List, Optional, Tuple
+
+from . import ledger
+from .utils import now_ms
+
+
+def source_files(legacy_path: str, shard_dir: str) -> List[str]:
+    files = sorted(glob.glob(os.path.join(shard_dir, "shard-*.jsonl")))
+    if os.path.exists(legacy_path):
+        files.insert(0, legacy_path)
+    return files
+
+
+def _records(path: str, stats: Dict[str, int]) -> Iterator[Tuple[int, bytes, Dict[str, Any]]]:
+    with open(path, "rb") as f:
+        for line in f:
+            try:
+                obj = json.loads(line)
+                if not isinstance(obj, dict) or not line.endswith(b"\n"):
+                    raise ValueError("torn")
+            except ValueError:
+                stats["skipped_torn"] += 1
+                continue
+            yield int(obj.get("ts") or 0), line, obj
+
+
+def rebalance(shards: int, legacy_path: Optional[str] = None, shard_dir: Optional[str] = None) -> Dict[str, Any]:
+    """Rewrite the ledger into ``shards`` shards (1 = the single-file layout)."""
+    legacy_path = legacy_path or ledger.LEDGER_PATH
+    shard_dir = (shard_dir or ledger.LEDGER_SHARD_DIR).rstrip(os.sep)
+    sources = source_files(legacy_path, shard_dir)
+    stats: Dict[str, Any] = {"sources": sources, "shards": shards, "records": 0, "skipped_torn": 0}
+
+    staging = f"{shard_dir}.rebalance"
+    shutil.rmtree(staging, ignore_errors=True)
+    os.makedirs(staging)
+    targets = [os.path.join(staging, "log.jsonl")] if shards <= 1 else [ledger.shard_path(i, staging) for i in range(shards)]
+    outs = [open(p, "wb") for p in targets]
+    try:
+        merged = heapq.merge(*(_records(p, stats) for p in sources), key=lambda r: r[0])
+        for _ts, line, obj in merged:
+            i = 0 if shards <= 1 else ledger.shard_of(ledger.route_key(obj.get("client_id")), shards)
+            outs[i].write(line)
+            stats["records"] += 1
+        for out in outs:
+            out.flush()
+            os.fsync(out.fileno())
+    finally:
+        for out in outs:
+            out.close()
+
+    # Move the old layout aside, then put the new one in place
+    suffix = f".old-{now_ms()}"
+    if os.path.exists(legacy_path):
+        os.replace(legacy_path, legacy_path + suffix)
+    if os.path.isdir(shard_dir):
+        os.replace(shard_dir, shard_dir + suffix)
+    if shards <= 1:
+        os.replace(targets[0], legacy_path)
+        os.rmdir(staging)
+    else:
+        os.replace(staging, shard_dir)
+    stats["backup_suffix"] = suffix
+    stats["epoch"] = _write_epoch(legacy_path, suffix[len(".old-"):])
+    return stats
+
+
+def _write_epoch(legacy_path: str, epoch: str) -> str:
+    path = ledger.epoch_path(legacy_path)
+    tmp = f"{path}.tmp"
+    with open(tmp, "w", encoding="utf-8") as f:
+        f.write(epoch + "\n")
+        f.flush()
+        os.fsync(f.fileno())
+    os.replace(tmp, path)
+    return epoch
+
+
+def main(argv: Optional[List[str]] = None) -> int:
+    parser = argparse.ArgumentParser(prog="python -m app.rebalance", description="Rewrite the ledger into N shards.")
+    parser.add_argument("--shards", type=int, required=True, help="new shard count (1 = single file)")
+    parser.add_argument("--ledger", default=None, help="single-file ledger path (default: %s)" % ledger.LEDGER_PATH)
+    parser.add_argument("--dir", default=None, help="shard directory (default: %s)" % ledger.LEDGER_SHARD_DIR)
+    args = parser.parse_args(argv)
+    if args.shards < 1:
+        parser.error("--shards must be >= 1")
+    print(json.dumps(rebalance(args.shards, args.ledger, args.dir), indent=2))
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
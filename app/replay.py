@@ -0,0 +1,188 @@
+"""Replay filter for spent PoW tickets.
+
+A time-windowed, rotating Bloom filter keyed by ``ticket_hash_hex``. The
+window is split into ``slots - 1`` periods; one slot receives new tickets
+for the current period and all live slots are checked, so a ticket is
+remembered for at least ``window_s``. When a slot's period comes round again
+it is cleared. Memory is fixed: ``slots`` bit arrays sized for ``capacity``
+tickets per period at ``fp_rate`` false positives (a false positive rejects a
+fresh ticket; it never admits a replay).
+
+With a ``name`` the filter lives in named shared memory so every worker
+process on the host sees the same set; check-and-add is serialized across
+processes with ``flock`` on a lock file (in-process only where ``fcntl`` is
+unavailable). Without a name it is private to the process.
+
+Layout: ``magic | m_bits | k | slots | period_ms`` (5 x 8 bytes), then one
+signed generation number per slot (-1 = empty), then the slot bit arrays.
+"""
+
+import hashlib
+import math
+import os
+import struct
+import threading
+import time
+from contextlib import contextmanager
+from multiprocessing import shared_memory
+from typing import Callable, Iterator, List, Optional
+
+from .utils import DATA_DIR
+
+try:
+    import fcntl
+except ImportError:  # Windows: in-process locking only
+    fcntl = None  # type: ignore
+
+MAGIC = b"PVWRPLY1"
+_PARAMS = struct.Struct("<8sQQQQ")
+
+
+class ReplayFilter:
+    """Rotating Bloom filter of seen ticket hashes."""
+
+    def __init__(
+        self,
+        window_s: float = 3600.0,
+        capacity: int = 1_000_000,
+        fp_rate: float = 1e-6,
+        slots: int = 4,
+        name: Optional[str] = None,
+        clock: Callable[[], float] = time.time,
+    ):
+        if slots < 2:
+            raise ValueError("slots must be >= 2")
+        self.window_s = float(window_s)
+        self.slots = slots
+        self.period_ms = max(1, int(self.window_s * 1000 / (slots - 1)))
+        m = math.ceil(-capacity * math.log(fp_rate) / (math.log(2) ** 2))
+        self.slot_bytes = (m + 7) // 8
+        self.m_bits = self.slot_bytes * 8
+        self.k = max(1, round(self.m_bits / capacity * math.log(2)))
+        self._gens = _PARAMS.size
+        self._bits = self._gens + 8 * slots
+        size = self._bits + slots * self.slot_bytes
+        self.name = name
+        self._clock = clock
+        self._lock = threading.Lock()
+        self._lock_path = os.path.join(DATA_DIR, f"{name}.lock") if name else None
+        self._shm: Optional[shared_memory.SharedMemory] = None
+
+        with self._locked():
+            if name:
+                self._shm = _open_shared(name, size)
+                self._buf = self._shm.buf
+            else:
+                self._buf = memoryview(bytearray(size))
+            params = (MAGIC, self.m_bits, self.k, self.slots, self.period_ms)
+            found = _PARAMS.unpack_from(self._buf, 0)
+            if found[0] != MAGIC:
+                _PARAMS.pack_into(self._buf, 0, *params)
+                for slot in range(slots):
+                    struct.pack_into("<q", self._buf, self._gens + 8 * slot, -1)
+            elif found != params:
+                raise RuntimeError(f"Replay filter '{name}' exists with different parameters; unlink it first")
+
+    @classmethod
+    def from_env(cls) -> Optional["ReplayFilter"]:
+        """Filter configured by REPLAY_* env vars; None when REPLAY_WINDOW_S=0.
+
+        REPLAY_SHM_NAME (default ``povpvw-replay``) names the shared segment;
+        set it empty for a per-process filter.
+        """
+        window_s = float(os.getenv("REPLAY_WINDOW_S", "3600"))
+        if window_s <= 0:
+            return None
+        return cls(
+            window_s=window_s,
+            capacity=int(os.getenv("REPLAY_CAPACITY", "1000000")),
+            fp_rate=float(os.getenv("REPLAY_FP_RATE", "1e-6")),
+            slots=int(os.getenv("REPLAY_SLOTS", "4")),
+            name=os.getenv("REPLAY_SHM_NAME", "povpvw-replay") or None,
+        )
+
+    @contextmanager
+    def _locked(self) -> Iterator[None]:
+        with self._lock:
+            if self._lock_path is None or fcntl is None:
+                yield
+                return
+            with open(self._lock_path, "a+b") as lf:
+                fcntl.flock(lf.fileno(), fcntl.LOCK_EX)
+                try:
+                    yield
+                finally:
+                    fcntl.flock(lf.fileno(), fcntl.LOCK_UN)
+
+    def _positions(self, key: str) -> List[int]:
+        try:
+            digest = bytes.fromhex(key)
+        except ValueError:
+            digest = b""
+        if len(digest) < 16:
+            digest = hashlib.sha256(key.encode()).digest()
+        h1 = int.from_bytes(digest[:8], "little")
+        h2 = int.from_bytes(digest[8:16], "little") | 1
+        return [(h1 + i * h2) % self.m_bits for i in range(self.k)]
+
+    def _gen(self, slot: int) -> int:
+        return struct.unpack_from("<q", self._buf, self._gens + 8 * slot)[0]
+
+    def _contains(self, slot: int, positions: List[int]) -> bool:
+        base = self._bits + slot * self.slot_bytes
+        buf = self._buf
+        return all(buf[base + (p >> 3)] & (1 << (p & 7)) for p in positions)
+
+    def check_and_add(self, key: str) -> bool:
+        """Record ``key``; return True if it was (probably) seen within the window."""
+        positions = self._positions(key)
+        gen = int(self._clock() * 1000) // self.period_ms
+        current = gen % self.slots
+        with self._locked():
+            for slot in range(self.slots):
+                if gen - self.slots < self._gen(slot) <= gen and self._contains(slot, positions):
+                    return True
+            if self._gen(current) != gen:
+                # This slot last held a period that is now outside the window
+                base = self._bits + current * self.slot_bytes
+                self._buf[base:base + self.slot_bytes] = bytes(self.slot_bytes)
+                struct.pack_into("<q", self._buf, self._gens + 8 * current, gen)
+            base = self._bits + current * self.slot_bytes
+            for p in positions:
+                self._buf[base + (p >> 3)] |= 1 << (p & 7)
+        return False
+
+    def close(self) -> None:
+        if self._shm is not None:
+            self._buf = memoryview(b"")
+            self._shm.close()
+            self._shm = None
+
+    def unlink(self) -> None:
+        """Destroy the shared segment (all workers lose the set)."""
+        if self.name:
+            self.close()
+            try:
+                seg = shared_memory.SharedMemory(name=self.name)
+            except FileNotFoundError:
+                return
+            seg.close()
+            seg.unlink()
+            if self._lock_path and os.path.exists(self._lock_path):
+                os.remove(self._lock_path)
+
+
+def _open_shared(name: str, size: int) -> shared_memory.SharedMemory:
+    try:
+        shm = shared_memory.SharedMemory(name=name, create=True, size=size)
+    except FileExistsError:
+        shm = shared_memory.SharedMemory(name=name)
+        if shm.size < size:
+            shm.close()
+            raise RuntimeError(f"Replay filter '{name}' exists with a smaller size; unlink it first")
+    if os.name == "posix":
+        # The segment must outlive any single worker: keep the resource
+        # tracker from unlinking it when this process exits
+        from multiprocessing import resource_tracker
+        resource_tracker.unregister(shm._name, "shared_memory")  # type: ignore[attr-defined]
+    return shm
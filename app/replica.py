@@ -0,0 +1,318 @@
+"""Verify-only read replicas.
+
+A replica tails the primary's ledger change feed (``GET /ledger/feed``, one
+per shard) into local :class:`~app.ledger.LedgerIndex` instances and answers
+txid/commitment/output_hash/stream_id lookups from them, never touching the
+primary's files. Received bytes are mirrored to local files so a restarted replica
+resumes from where it stopped. Offsets are tied to the primary's ledger
+epoch (``X-Ledger-Epoch``); when a rebalance changes it, the replica drops
+its mirrors and indexes and tails every shard again from offset 0.
+"""
+
+import os
+import threading
+import time
+import urllib.parse
+import urllib.request
+from typing import Any, Dict, List, Optional, Tuple
+
+from .ledger import LedgerIndex, shard_of, split_txid
+from .utils import DATA_DIR, now_ms
+
+DEFAULT_MIRROR_PATH = os.path.join(DATA_DIR, "replica.jsonl")
+# Carries the shared replication secret (LEDGER_FEED_TOKEN) on feed requests
+FEED_TOKEN_HEADER = "X-Ledger-Feed-Token"
+
+
+class LedgerReplica:
+    """Tails a primary's ledger feed into a local index.
+
+    ``poll_s`` is the long-poll wait passed to the primary; the feed returns
+    as soon as new records exist. Lag is reported as bytes behind the
+    primary's ledger size (as last seen) and, in milliseconds, the age of the
+    oldest data not yet applied: 0 when nothing is pending, otherwise
+    measured from the ``ts`` of the last record applied on a lagging shard
+    (the first unapplied record is no older than that). When the last sync
+    failed, or the last successful one is more than ``stale_s`` old (default
+    ``poll_s`` + 5 s), the primary may have moved on unseen, so the lag is at
+    least the age of that last successful sync.
+    """
+
+    def __init__(
+        self,
+        primary_url: str,
+        mirror_path: Optional[str] = DEFAULT_MIRROR_PATH,
+        poll_s: float = 5.0,
+        catchup_s: float = 0.25,
+        stale_s: Optional[float] = None,
+        feed_token: Optional[str] = None,
+    ):
+        self.primary_url = primary_url.rstrip("/")
+        self.feed_token = feed_token
+        self.mirror_path = mirror_path
+        self.poll_s = poll_s
+        self.stale_s = poll_s + 5.0 if stale_s is None else stale_s
+        # Lookup misses trigger at most one catch-up sync per catchup_s
+        self.catchup_s = catchup_s
+        self._catchup_lock = threading.Lock()
+        self._last_catchup = float("-inf")
+        # One index (and mirror file) per primary shard; the shard count is
+        # learned from the feed's X-Ledger-Shards header
+        self.indexes: List[LedgerIndex] = []
+        self.primary_sizes: List[int] = []
+        # Time (ms) of the last sync that reached the primary on every shard
+        self.synced_at: Optional[int] = None
+        self.last_error: Optional[str] = None
+        self._lock = threading.Lock()
+        self._stop = threading.Event()
+        self._thread: Optional[threading.Thread] = None
+        # Primary ledger epoch the mirrors belong to (None: not known yet)
+        self.epoch: Optional[str] = None
+        self.resets = 0
+        epoch_file = self._epoch_file()
+        if epoch_file and os.path.exists(epoch_file):
+            with open(epoch_file, "r", encoding="utf-8") as f:
+                self.epoch = f.read().strip() or None
+        self._ensure_shards(1)
+        while self.mirror_path and os.path.exists(self._mirror(len(self.indexes))):
+            self._ensure_shards(len(self.indexes) + 1)
+
+    @classmethod
+    def from_env(cls) -> Optional["LedgerReplica"]:
+        """Replica configured by LEDGER_PRIMARY_URL, or None on a primary."""
+        url = os.getenv("LEDGER_PRIMARY_URL")
+        if not url:
+            return None
+        return cls(
+            url,
+            mirror_path=os.getenv("REPLICA_MIRROR_PATH", DEFAULT_MIRROR_PATH),
+            poll_s=float(os.getenv("REPLICA_POLL_S", "5")),
+            catchup_s=float(os.getenv("REPLICA_CATCHUP_S", "0.25")),
+            stale_s=float(os.environ["REPLICA_STALE_S"]) if os.getenv("REPLICA_STALE_S") else None,
+            feed_token=os.getenv("LEDGER_FEED_TOKEN"),
+        )
+
+    @property
+    def shards(self) -> int:
+        return len(self.indexes)
+
+    def _mirror(self, shard: int) -> Optional[str]:
+        if not self.mirror_path:
+            return None
+        return self.mirror_path if shard == 0 else f"{self.mirror_path}.{shard}"
+
+    def _epoch_file(self) -> Optional[str]:
+        return f"{self.mirror_path}.epoch" if self.mirror_path else None
+
+    def _reset(self, epoch: str, shards: int) -> None:
+        """Forget everything applied so far: the primary rewrote its ledger."""
+        for shard in range(len(self.indexes)):
+            mirror = self._mirror(shard)
+            if mirror and os.path.exists(mirror):
+                os.remove(mirror)
+        self.indexes = []
+        self.primary_sizes = []
+        self._ensure_shards(max(shards, 1))
+        # Only once the old mirrors are gone, so a crash in between resets again
+        self._set_epoch(epoch)
+        self.resets += 1
+
+    def _set_epoch(self, epoch: str) -> None:
+        epoch_file = self._epoch_file()
+        if epoch_file:
+            os.makedirs(os.path.dirname(os.path.abspath(epoch_file)), exist_ok=True)
+            with open(epoch_file, "w", encoding="utf-8") as f:
+                f.write(epoch + "\n")
+        self.epoch = epoch
+
+    def _ensure_shards(self, n: int) -> None:
+        while len(self.indexes) < n:
+            mirror = self._mirror(len(self.indexes))
+            index = LedgerIndex(mirror)
+            if mirror:
+                index.ingest_file(mirror)
+            self.indexes.append(index)
+            self.primary_sizes.append(index.offset)
+
+    def _feed_params(self, offset: int, wait: float, shard: int) -> Dict[str, Any]:
+        params: Dict[str, Any] = {"offset": offset, "wait": wait, "shard": shard}
+        if self.epoch is not None:
+            params["epoch"] = self.epoch
+        return params
+
+    def _fetch(self, offset: int, wait: float, shard: int) -> Tuple[bytes, Dict[str, str]]:
+        query = urllib.parse.urlencode(self._feed_params(offset, wait, shard))
+        url = f"{self.primary_url}/ledger/feed?{query}"
+        headers = {FEED_TOKEN_HEADER: self.feed_token} if self.feed_token else {}
+        req = urllib.request.Request(url, headers=headers)
+        with urllib.request.urlopen(req, timeout=wait + 30) as resp:  # nosec B310 - configured primary URL
+            return resp.read(), {k.lower(): v for k, v in resp.headers.items()}
+
+    def _sync_shard(self, shard: int, wait: float) -> int:
+        with self._lock:
+            offset = self.indexes[shard].offset
+        data, headers = self._fetch(offset, wait, shard)
+        with self._lock:
+            epoch = headers.get("x-ledger-epoch")
+            if epoch is not None and epoch != self.epoch:
+                if self.epoch is None and not any(i.offset for i in self.indexes):
+                    # First contact and nothing applied yet: nothing to drop
+                    self._set_epoch(epoch)
+                else:
+                    self._reset(epoch, int(headers.get("x-ledger-shards", 1)))
+                    return 0
+            self._ensure_shards(int(headers.get("x-ledger-shards", 1)))
+            if shard >= self.shards:
+                return 0
+            index = self.indexes[shard]
+            if index.offset != offset:
+                # Another caller applied this page concurrently
+                return 0
+            if data:
+                mirror = self._mirror(shard)
+                if mirror:
+                    os.makedirs(os.path.dirname(os.path.abspath(mirror)), exist_ok=True)
+                    with open(mirror, "ab") as f:
+                        f.write(data)
+                index.ingest(data)
+            self.primary_sizes[shard] = int(headers.get("x-ledger-size", index.offset))
+        return len(data)
+
+    def sync_once(self, wait: float = 0.0) -> int:
+        """Fetch and apply one feed page per shard. Returns the bytes applied."""
+        applied = 0
+        shard = 0
+        resets = self.resets
+        while shard < self.shards:
+            # Long-polling only makes sense with a single feed to watch
+            applied += self._sync_shard(shard, wait if self.shards == 1 else 0.0)
+            shard += 1
+        with self._lock:
+            # After a reset nothing is known about the new epoch's sizes yet
+            self.synced_at = now_ms() if self.resets == resets else None
+            self.last_error = None
+        return applied
+
+    def _behind(self) -> bool:
+        return any(i.offset < size for i, size in zip(self.indexes, self.primary_sizes))
+
+    def _run(self) -> None:
+        while not self._stop.is_set():
+            try:
+                # Drain without waiting while behind; long-poll once caught up
+                behind = self._behind()
+                applied = self.sync_once(wait=0.0 if behind else self.poll_s)
+                if not applied and self.shards > 1:
+                    self._stop.wait(min(self.poll_s, 1.0))
+            except Exception as e:
+                self.last_error = str(e)
+                self._stop.wait(min(self.poll_s, 1.0))
+
+    def start(self) -> None:
+        if self._thread is None:
+            self._thread = threading.Thread(target=self._run, name="ledger-replica", daemon=True)
+            self._thread.start()
+
+    def stop(self) -> None:
+        self._stop.set()
+
+    # --- Lookups ---
+    def _candidates(self, txid: str) -> List[LedgerIndex]:
+        route, _ = split_txid(txid)
+        if route is None or self.shards == 1:
+            return list(self.indexes)
+        return [self.indexes[shard_of(route, self.shards)]]
+
+    def _find_txid(self, txid: str) -> Optional[Dict[str, Any]]:
+        for index in self._candidates(txid):
+            rec = index.get(txid)
+            if rec is not None:
+                return rec
+        return None
+
+    def _find_commitment(self, commitment: str) -> Optional[Dict[str, Any]]:
+        for index in list(self.indexes):
+            rec = index.find_by_commitment(commitment)
+            if rec is not None:
+                return rec
+        return None
+
+    def _find_stream_id(self, stream_id: str) -> Optional[Dict[str, Any]]:
+        for index in list(self.indexes):
+            rec = index.find_by_stream_id(stream_id)
+            if rec is not None:
+                return rec
+        return None
+
+    def _find_output_hash(self, output_hash: str) -> Optional[Dict[str, Any]]:
+        for index in list(self.indexes):
+            rec = index.find_by_output_hash(output_hash)
+            if rec is not None:
+                return rec
+        return None
+
+    def _catch_up(self) -> None:
+        """One sync on behalf of lookup misses.
+
+        Concurrent misses share a single sync, and syncs are at least
+        ``catchup_s`` apart, so misses cannot turn into a stream of requests
+        to the primary.
+        """
+        if not self._catchup_lock.acquire(blocking=False):
+            # Another miss is syncing: wait for it rather than fetching again
+            with self._catchup_lock:
+                return
+        try:
+            if time.monotonic() - self._last_catchup < self.catchup_s:
+                return
+            self._last_catchup = time.monotonic()
+            self.sync_once()
+        except Exception as e:
+            self.last_error = str(e)
+        finally:
+            self._catchup_lock.release()
+
+    def _lookup(self, finder, key: str, only_if_behind: bool = False) -> Optional[Dict[str, Any]]:
+        rec = finder(key)
+        if rec is None and (not only_if_behind or self._behind()):
+            # Catch up before reporting a miss (e.g. txid issued moments ago)
+            self._catch_up()
+            rec = finder(key)
+        return rec
+
+    def find_commitment_by_txid(self, txid: str) -> Optional[Dict[str, Any]]:
+        return self._lookup(self._find_txid, txid)
+
+    def find_issue_by_commitment(self, commitment: str) -> Optional[Dict[str, Any]]:
+        return self._lookup(self._find_commitment, commitment)
+
+    def find_issue_by_stream_id(self, stream_id: str) -> Optional[Dict[str, Any]]:
+        return self._lookup(self._find_stream_id, stream_id)
+
+    def find_issue_by_output_hash(self, output_hash: str) -> Optional[Dict[str, Any]]:
+        # Misses are the normal answer for edited content: only sync when
+        # the replica already knows it is behind
+        return self._lookup(self._find_output_hash, output_hash, only_if_behind=True)
+
+    def lag(self) -> Dict[str, Any]:
+        lagging = [i for i, size in zip(self.indexes, self.primary_sizes) if size > i.offset]
+        behind = sum(max(size - i.offset, 0) for i, size in zip(self.indexes, self.primary_sizes))
+        now = now_ms()
+        ms: Optional[int] = None
+        if self.synced_at is None:
+            ms = None
+        elif not lagging:
+            ms = 0
+        elif all(i.last_ts is not None for i in lagging):
+            ms = max(now - min(i.last_ts for i in lagging), 0)  # type: ignore[type-var]
+        if ms is not None and self.synced_at is not None:
+            since_sync = now - self.synced_at
+            if self.last_error is not None or since_sync > self.stale_s * 1000:
+                # Primary sizes are stale: whatever it appended since is unseen
+                ms = max(ms, since_sync)
+        return {
+            "bytes": behind,
+            "ms": ms,
+            "offset": sum(i.offset for i in self.indexes),
+            "error": self.last_error,
+        }
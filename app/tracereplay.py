@@ -0,0 +1,593 @@
+"""Trace-replay performance regression gate.
+
+Builds a replayable workload from an existing ledger plus an optional
+sanitized request log, replays it against ``app.main`` and compares
+throughput, latency and results with a stored baseline run.
+
+Usage::
+
+    python -m app.tracereplay build --out workload.json [--ledger FILE ...] [--requests requests.ndjson]
+    python -m app.tracereplay run workload.json --out run.json [--concurrency N] [--speed X] [--url URL]
+    python -m app.tracereplay compare baseline.json run.json [--throughput-tol 0.10] [--latency-tol 0.25]
+    python -m app.tracereplay gate workload.json --baseline baseline.json [--update-baseline]
+
+The ledger (default: every file of the configured ledger) gives the record
+mix: issues, seed-aware and txid verifies, untouched vs edited copies and
+repeated tickets, with their inter-arrival timing. The request log is NDJSON,
+one object per request: ``ts`` (ms), ``path``, ``bytes`` (request body size)
+and optionally ``status``, ``txid``, ``commitment``, ``ticket_hash`` and
+``output_hash``. It adds what the ledger does not record (txid/commitment
+lookups, exact-match verifies, ticket replays rejected with 409) and the real
+content-size distribution. The workload keeps no client ids, hashes or
+content: clients become ``c<N>`` pseudonyms and content is synthesized at
+the recorded sizes.
+
+Without ``--url`` the run is in-process against a temporary ledger, with
+quotas off and a private replay filter. ``compare`` and ``gate`` exit 1 on a
+regression and 2 when the runs are not comparable.
+"""
+
+import argparse
+import hashlib
+import json
+import os
+import random
+import shutil
+import sys
+import tempfile
+import threading
+import time
+import urllib.error
+import urllib.parse
+import urllib.request
+from collections import Counter
+from concurrent.futures import Future, ThreadPoolExecutor
+from typing import Any, Dict, List, Optional, Tuple
+
+from . import ledger
+
+WORKLOAD_VERSION = 1
+DEFAULT_SIZE = 2048
+PERCENTILES = (50, 95, 99)
+
+
+# --- Building a workload ---
+def _read_ledger(paths: List[str], stats: Counter) -> List[Dict[str, Any]]:
+    records = []
+    for path in paths:
+        if not os.path.exists(path):
+            continue
+        with open(path, "rb") as f:
+            for line in f:
+                try:
+                    obj = json.loads(line)
+                    if not isinstance(obj, dict) or not line.endswith(b"\n"):
+                        raise ValueError("torn")
+                except ValueError:
+                    stats["skipped_torn"] += 1
+                    continue
+                records.append(obj)
+    records.sort(key=lambda r: int(r.get("ts") or 0))
+    return records
+
+
+def _read_requests(path: str, stats: Counter) -> List[Dict[str, Any]]:
+    entries = []
+    with open(path, "r", encoding="utf-8") as f:
+        for line in f:
+            try:
+                obj = json.loads(line)
+            except ValueError:
+                stats["skipped_requests"] += 1
+                continue
+            if isinstance(obj, dict) and "path" in obj:
+                entries.append(obj)
+    return entries
+
+
+def request_kind(path: str) -> Optional[str]:
+    """Workload op kind of a request path (None for paths not replayed)."""
+    path = path.split("?", 1)[0]
+    if path.startswith("/ledger/txid/"):
+        return "lookup_txid"
+    if path.startswith("/ledger/commitment/"):
+        return "lookup_commitment"
+    if path.startswith("/verify_v2/exact"):
+        return "verify_exact"
+    if path.startswith("/issue"):
+        return "issue"
+    if path.startswith("/verify"):
+        return "verify"
+    return None
+
+
+def build_workload(
+    ledger_paths: List[str],
+    request_log: Optional[str] = None,
+    default_size: int = DEFAULT_SIZE,
+    seed: int = 0,
+    max_ops: Optional[int] = None,
+) -> Dict[str, Any]:
+    """Turn ledger records (and request log entries) into a list of replay ops."""
+    stats: Counter = Counter()
+    records = _read_ledger(ledger_paths, stats)
+    requests = _read_requests(request_log, stats) if request_log else []
+
+    sizes: Dict[str, List[int]] = {}
+    for entry in requests:
+        kind = request_kind(entry["path"])
+        if kind in ("issue", "verify", "verify_exact") and int(entry.get("bytes") or 0) > 0:
+            sizes.setdefault(kind, []).append(int(entry["bytes"]))
+    rng = random.Random(seed)
+
+    def size_for(kind: str) -> int:
+        pool = sizes.get(kind) or sizes.get("issue")
+        return rng.choice(pool) if pool else default_size
+
+    # Ledger records and replayable requests on one timeline
+    events: List[Tuple[int, int, str, Dict[str, Any]]] = []
+    for seq, rec in enumerate(records):
+        events.append((int(rec.get("ts") or 0), seq, "ledger", rec))
+    for seq, entry in enumerate(requests, start=len(records)):
+        kind = request_kind(entry["path"])
+        if kind in ("lookup_txid", "lookup_commitment", "verify_exact") or (kind == "issue" and entry.get("status") == 409):
+            events.append((int(entry.get("ts") or 0), seq, "request", entry))
+    events.sort(key=lambda e: (e[0], e[1]))
+
+    ops: List[Dict[str, Any]] = []
+    clients: Dict[str, str] = {}
+    by_txid: Dict[str, int] = {}
+    by_commitment: Dict[str, int] = {}
+    by_ticket: Dict[str, int] = {}
+    by_output: Dict[str, int] = {}
+    output_hash: Dict[int, str] = {}
+    start_ts = events[0][0] if events else 0
+
+    def client(cid: Any) -> str:
+        return clients.setdefault(str(cid), f"c{len(clients)}")
+
+    def add(ts: int, op: Dict[str, Any]) -> int:
+        op["t"] = max(ts - start_ts, 0)
+        ops.append(op)
+        stats[op["kind"]] += 1
+        return len(ops) - 1
+
+    for ts, _seq, origin, obj in events:
+        if max_ops is not None and len(ops) >= max_ops:
+            break
+        if origin == "ledger":
+            kind = obj.get("type")
+            if kind == "issue":
+                t_hash = obj.get("ticket_hash")
+                if t_hash in by_ticket:
+                    add(ts, {"kind": "reissue", "client": client(obj.get("client_id")), "ref": by_ticket[t_hash]})
+                    continue
+                endpoint = "/issue" if "receipt_sig" in obj else "/issue_v2"
+                i = add(ts, {"kind": "issue", "endpoint": endpoint, "client": client(obj.get("client_id")), "size": size_for("issue")})
+                for key, index in ((obj.get("txid"), by_txid), (obj.get("commitment"), by_commitment),
+                                   (t_hash, by_ticket), (obj.get("output_hash"), by_output)):
+                    if key:
+                        index.setdefault(key, i)
+                output_hash[i] = obj.get("output_hash", "")
+            elif kind == "verify":
+                ref = by_commitment.get(obj.get("commitment"))
+                if ref is None:
+                    stats["skipped_unresolved"] += 1
+                    continue
+                add(ts, {
+                    "kind": "verify",
+                    "endpoint": "/verify" if "transcript_sig" in obj else "/verify_v2",
+                    "client": client(obj.get("client_id")),
+                    "ref": ref,
+                    "mode": "ticket" if "ticket_hash" in obj else "txid",
+                    "exact": obj.get("content_hash") == output_hash.get(ref),
+                })
+            else:
+                stats[f"skipped_{kind}"] += 1
+            continue
+
+        kind = request_kind(obj["path"])
+        if kind == "issue":
+            ref = by_ticket.get(obj.get("ticket_hash"))
+            if ref is None:
+                stats["skipped_unresolved"] += 1
+                continue
+            add(ts, {"kind": "reissue", "client": ops[ref]["client"], "ref": ref})
+        elif kind == "verify_exact":
+            ref = by_txid.get(obj.get("txid")) if obj.get("txid") else by_output.get(obj.get("output_hash"))
+            op = {"kind": "verify_exact", "client": client(obj.get("client", "anon")), "ref": ref}
+            if ref is None:
+                op["size"] = int(obj.get("bytes") or 0) or size_for("verify_exact")
+            add(ts, op)
+        else:
+            key = obj.get("txid" if kind == "lookup_txid" else "commitment") or obj["path"].rstrip("/").rsplit("/", 1)[-1]
+            ref = (by_txid if kind == "lookup_txid" else by_commitment).get(key)
+            add(ts, {"kind": kind, "ref": ref})
+
+    return {
+        "version": WORKLOAD_VERSION,
+        "built_from": {"ledger": [os.path.abspath(p) for p in ledger_paths],
+                       "request_log": os.path.abspath(request_log) if request_log else None},
+        "stats": dict(stats),
+        "ops": ops,
+    }
+
+
+def workload_digest(workload: Dict[str, Any]) -> str:
+    return hashlib.sha256(json.dumps(workload["ops"], sort_keys=True).encode()).hexdigest()
+
+
+# --- Targets ---
+class InProcessTarget:
+    """``app.main`` in this process, on a temporary ledger."""
+
+    def __init__(self) -> None:
+        from fastapi.testclient import TestClient
+        from . import main
+        from .quota import QuotaTracker
+        from .replay import ReplayFilter
+
+        self._main = main
+        self._tmp = tempfile.mkdtemp(prefix="tracereplay-")
+        self._saved = (ledger.LEDGER_PATH, ledger.LEDGER_SHARD_DIR, main.quotas, main.replay_filter, main.replica)
+        ledger.LEDGER_PATH = os.path.join(self._tmp, "log.jsonl")
+        ledger.LEDGER_SHARD_DIR = os.path.join(self._tmp, "ledger")
+        main.quotas = QuotaTracker({})
+        main.replay_filter = ReplayFilter(window_s=3600, capacity=100_000)
+        main.replica = None
+        self.client = TestClient(main.app)
+
+    def request(self, method: str, path: str, **kw: Any) -> Tuple[int, bytes, Dict[str, str]]:
+        r = self.client.request(method, path, **kw)
+        return r.status_code, r.content, {k.lower(): v for k, v in r.headers.items()}
+
+    def close(self) -> None:
+        main = self._main
+        ledger.LEDGER_PATH, ledger.LEDGER_SHARD_DIR, main.quotas, main.replay_filter, main.replica = self._saved
+        shutil.rmtree(self._tmp, ignore_errors=True)
+
+
+class HttpTarget:
+    """A running server (e.g. ``uvicorn app.main:app``)."""
+
+    def __init__(self, url: str) -> None:
+        self.url = url.rstrip("/")
+
+    def request(self, method: str, path: str, json: Any = None, content: Optional[bytes] = None,
+                headers: Optional[Dict[str, str]] = None, params: Optional[Dict[str, Any]] = None,
+                ) -> Tuple[int, bytes, Dict[str, str]]:
+        url = self.url + path + ("?" + urllib.parse.urlencode(params) if params else "")
+        headers = dict(headers or {})
+        data = content
+        if json is not None:
+            data = _json_bytes(json)
+            headers["Content-Type"] = "application/json"
+        req = urllib.request.Request(url, data=data, method=method, headers=headers)
+        try:
+            with urllib.request.urlopen(req, timeout=120) as resp:  # nosec B310 - operator-supplied URL
+                return resp.status, resp.read(), {k.lower(): v for k, v in resp.headers.items()}
+        except urllib.error.HTTPError as e:
+            return e.code, e.read(), {}
+
+    def close(self) -> None:
+        pass
+
+
+def _json_bytes(obj: Any) -> bytes:
+    return json.dumps(obj).encode()
+
+
+# --- Replaying ---
+def synth_content(i: int, size: int) -> str:
+    """Deterministic ASCII text of ``size`` bytes for op ``i``."""
+    filler = "lorem ipsum dolor sit amet consectetur adipiscing elit "
+    text = f"trace op {i} " + filler * (size // len(filler) + 1)
+    return text[:max(size, 1)]
+
+
+class Replayer:
+    """Runs workload ops against a target, recording status, outcome and latency."""
+
+    def __init__(self, workload: Dict[str, Any], target: Any, run_id: Optional[str] = None):
+        self.ops = workload["ops"]
+        self.target = target
+        self.run_id = run_id or os.urandom(4).hex()
+        self.futures: Dict[int, "Future[Optional[Dict[str, Any]]]"] = {}
+        self.samples: List[Tuple[str, int, str, float]] = []
+        self._lock = threading.Lock()
+
+    def _ticket(self, i: int, client: str, endpoint: str, content: bytes) -> Dict[str, Any]:
+        # Fresh nonce per run so repeated runs against one server are not replays
+        return {"client_id": client, "endpoint": endpoint, "body_hash": hashlib.sha256(content).hexdigest(),
+                "nonce": f"{self.run_id}-{i}", "difficulty": 0}
+
+    def _output(self, ref: Optional[int]) -> Optional[Dict[str, Any]]:
+        return self.futures[ref].result() if ref is not None and ref in self.futures else None
+
+    def _run_op(self, i: int) -> Optional[Dict[str, Any]]:
+        op = self.ops[i]
+        key = f"{op['kind']} {op['endpoint']}" if "endpoint" in op else op["kind"]
+        ref = self._output(op.get("ref"))
+        if op["kind"] in ("reissue", "verify") and ref is None:
+            self._record(key, 0, "ref_failed", 0.0)
+            return None
+        t0 = time.perf_counter()
+        try:
+            status, outcome, produced = self._execute(i, op, ref)
+        except Exception as e:
+            status, outcome, produced = 0, f"error {type(e).__name__}", None
+        self._record(key, status, outcome, (time.perf_counter() - t0) * 1000)
+        return produced
+
+    def _execute(self, i: int, op: Dict[str, Any], ref: Optional[Dict[str, Any]]) -> Tuple[int, str, Optional[Dict[str, Any]]]:
+        """Send one op; returns (status, outcome, output for later ops)."""
+        kind = op["kind"]
+        produced: Optional[Dict[str, Any]] = None
+        outcome = ""
+        if kind == "issue":
+            text = synth_content(i, op["size"])
+            ticket = self._ticket(i, op["client"], "/issue", text.encode())
+            if op["endpoint"] == "/issue":
+                pow = {k: ticket[k] for k in ("body_hash", "nonce", "difficulty")}
+                status, body, _ = self.target.request("POST", "/issue", json={"text": text, "client_id": op["client"], "pow": pow})
+            else:
+                status, body, _ = self.target.request("POST", "/issue_v2", json={"content": text, "ticket": ticket})
+            if status == 200:
+                data = json.loads(body)
+                receipt = data.get("receipt", data)
+                produced = {"text": text, "content": data["watermarked"], "ticket": ticket,
+                            "txid": receipt["txid"], "commitment": receipt["commitment"]}
+        elif kind == "reissue":
+            status, body, _ = self.target.request("POST", "/issue_v2", json={"content": ref["text"], "ticket": ref["ticket"]})
+        elif kind == "verify":
+            content = ref["content"] if op["exact"] else ref["content"] + " (edited)"
+            if op["endpoint"] == "/verify":
+                pow = self._ticket(i, op["client"], "/verify", content.encode())
+                payload = {"content": content, "client_id": op["client"], "evidence": {"txid": ref["txid"]},
+                           "pow": {k: pow[k] for k in ("body_hash", "nonce", "difficulty")}}
+                status, body, _ = self.target.request("POST", "/verify", json=payload)
+                if status == 200:
+                    outcome = "present" if json.loads(body)["decision"] else "absent"
+            else:
+                payload = {"content": content, "client_id": op["client"]}
+                if op["mode"] == "ticket":
+                    payload["ticket"] = ref["ticket"]
+                else:
+                    payload["evidence"] = {"txid": ref["txid"]}
+                status, body, _ = self.target.request("POST", "/verify_v2", json=payload)
+                if status == 200:
+                    outcome = "present" if json.loads(body)["detection"]["present"] else "absent"
+        elif kind == "verify_exact":
+            content = ref["content"].encode() if ref else synth_content(i, op.get("size", DEFAULT_SIZE)).encode()
+            status, body, _ = self.target.request("POST", "/verify_v2/exact", content=content, headers={
+                "Content-Type": "application/octet-stream", "X-Client-Id": op["client"]})
+            if status == 200:
+                outcome = "match" if json.loads(body)["match"] else "miss"
+        else:
+            field = "txid" if kind == "lookup_txid" else "commitment"
+            value = ref[field] if ref else "0" * 64
+            status, body, _ = self.target.request("GET", f"/ledger/{field}/{value}")
+        return status, outcome, produced
+
+    def _record(self, key: str, status: int, outcome: str, latency_ms: float) -> None:
+        with self._lock:
+            self.samples.append((key, status, outcome, latency_ms))
+
+    def run(self, concurrency: int = 1, speed: float = 0.0) -> float:
+        """Replay every op; returns wall time in seconds.
+
+        ``speed`` > 0 paces submissions by the recorded inter-arrival times
+        (2.0 = twice as fast); 0 submits as fast as the workers take them.
+        """
+        started = time.perf_counter()
+        with ThreadPoolExecutor(max_workers=max(1, concurrency)) as pool:
+            for i, op in enumerate(self.ops):
+                if speed > 0:
+                    delay = started + op["t"] / 1000 / speed - time.perf_counter()
+                    if delay > 0:
+                        time.sleep(delay)
+                # Ops only wait on earlier ops, which the FIFO pool has already started
+                self.futures[i] = pool.submit(self._run_op, i)
+            for f in self.futures.values():
+                f.exception()
+        return time.perf_counter() - started
+
+
+def _percentile(sorted_values: List[float], p: float) -> float:
+    if not sorted_values:
+        return 0.0
+    rank = max(int(round(p / 100 * len(sorted_values) + 0.5)) - 1, 0)
+    return sorted_values[min(rank, len(sorted_values) - 1)]
+
+
+def summarize(samples: List[Tuple[str, int, str, float]], wall_s: float) -> Dict[str, Any]:
+    by_kind: Dict[str, Dict[str, Any]] = {}
+    latencies: Dict[str, List[float]] = {}
+    for key, status, outcome, latency_ms in samples:
+        entry = by_kind.setdefault(key, {"count": 0, "status": Counter(), "outcomes": Counter()})
+        entry["count"] += 1
+        entry["status"][str(status)] += 1
+        if outcome:
+            entry["outcomes"][outcome] += 1
+        latencies.setdefault(key, []).append(latency_ms)
+    for key, entry in by_kind.items():
+        values = sorted(latencies[key])
+        entry["status"] = dict(entry["status"])
+        entry["outcomes"] = dict(entry["outcomes"])
+        entry["latency_ms"] = {f"p{p}": round(_percentile(values, p), 3) for p in PERCENTILES}
+        entry["latency_ms"]["max"] = round(values[-1], 3)
+    return {
+        "ops": len(samples),
+        "wall_s": round(wall_s, 3),
+        "throughput_ops_s": round(len(samples) / max(wall_s, 1e-9), 2),
+        "by_kind": dict(sorted(by_kind.items())),
+    }
+
+
+def run_workload(workload: Dict[str, Any], url: Optional[str] = None, concurrency: int = 1, speed: float = 0.0) -> Dict[str, Any]:
+    target = HttpTarget(url) if url else InProcessTarget()
+    try:
+        replayer = Replayer(workload, target)
+        wall_s = replayer.run(concurrency=concurrency, speed=speed)
+    finally:
+        target.close()
+    result = summarize(replayer.samples, wall_s)
+    result["workload_sha256"] = workload_digest(workload)
+    result["settings"] = {"target": url or "in-process", "concurrency": concurrency, "speed": speed}
+    result["python"] = sys.version.split()[0]
+    return result
+
+
+# --- Comparing runs ---
+def compare_runs(
+    baseline: Dict[str, Any],
+    current: Dict[str, Any],
+    throughput_tol: float = 0.10,
+    latency_tol: float = 0.25,
+    latency_floor_ms: float = 1.0,
+) -> Tuple[List[Tuple[str, Any, Any, str, bool]], List[str]]:
+    """Diff two run summaries.
+
+    Returns (rows, regressions); each row is (metric, baseline, current,
+    change, regressed). Latency only counts as regressed when it also grew
+    by more than ``latency_floor_ms``. Status and outcome counts must match
+    exactly.
+    """
+    rows: List[Tuple[str, Any, Any, str, bool]] = []
+    regressions: List[str] = []
+
+    def change(b: float, c: float) -> str:
+        return f"{(c - b) / b * 100:+.1f}%" if b else "n/a"
+
+    b_tp, c_tp = baseline["throughput_ops_s"], current["throughput_ops_s"]
+    bad = c_tp < b_tp * (1 - throughput_tol)
+    rows.append(("throughput_ops_s", b_tp, c_tp, change(b_tp, c_tp), bad))
+    if bad:
+        regressions.append(f"throughput dropped {change(b_tp, c_tp)} (tolerance -{throughput_tol:.0%})")
+
+    kinds = sorted(set(baseline["by_kind"]) | set(current["by_kind"]))
+    for kind in kinds:
+        b = baseline["by_kind"].get(kind)
+        c = current["by_kind"].get(kind)
+        if b is None or c is None:
+            rows.append((f"{kind} count", b and b["count"], c and c["count"], "missing", True))
+            regressions.append(f"{kind}: only in {'current' if b is None else 'baseline'} run")
+            continue
+        for p in ("p50", "p95"):
+            bl, cl = b["latency_ms"][p], c["latency_ms"][p]
+            bad = cl > bl * (1 + latency_tol) and cl - bl > latency_floor_ms
+            rows.append((f"{kind} {p} ms", bl, cl, change(bl, cl), bad))
+            if bad:
+                regressions.append(f"{kind}: {p} latency {bl} -> {cl} ms ({change(bl, cl)}, tolerance +{latency_tol:.0%})")
+        for field in ("status", "outcomes"):
+            if b[field] != c[field]:
+                rows.append((f"{kind} {field}", b[field], c[field], "changed", True))
+                regressions.append(f"{kind}: {field} changed {b[field]} -> {c[field]}")
+    return rows, regressions
+
+
+def comparable(baseline: Dict[str, Any], current: Dict[str, Any]) -> Optional[str]:
+    """Why two runs cannot be compared, or None."""
+    if baseline.get("workload_sha256") != current.get("workload_sha256"):
+        return "runs replayed different workloads"
+    if baseline.get("settings") != current.get("settings"):
+        return f"run settings differ: {baseline.get('settings')} vs {current.get('settings')}"
+    return None
+
+
+def report(baseline: Dict[str, Any], current: Dict[str, Any], **tolerances: float) -> int:
+    """Print the diff; exit status 0 = ok, 1 = regression, 2 = not comparable."""
+    reason = comparable(baseline, current)
+    if reason:
+        print(f"NOT COMPARABLE: {reason}", file=sys.stderr)
+        return 2
+    rows, regressions = compare_runs(baseline, current, **tolerances)
+    width = max(len(r[0]) for r in rows)
+    print(f"{'metric':<{width}}  {'baseline':>12}  {'current':>12}  change")
+    for metric, b, c, delta, bad in rows:
+        print(f"{metric:<{width}}  {str(b):>12}  {str(c):>12}  {delta}{'  <-- REGRESSION' if bad else ''}")
+    if regressions:
+        print("\nREGRESSIONS:", file=sys.stderr)
+        for line in regressions:
+            print(f"  - {line}", file=sys.stderr)
+        return 1
+    print("\nOK: no regressions")
+    return 0
+
+
+def _load(path: str) -> Dict[str, Any]:
+    with open(path, "r", encoding="utf-8") as f:
+        return json.load(f)
+
+
+def _dump(obj: Dict[str, Any], path: str) -> None:
+    with open(path, "w", encoding="utf-8") as f:
+        json.dump(obj, f, indent=2)
+        f.write("\n")
+
+
+def main(argv: Optional[List[str]] = None) -> int:
+    parser = argparse.ArgumentParser(prog="python -m app.tracereplay", description="Replay ledger-shaped load and gate on regressions.")
+    sub = parser.add_subparsers(dest="cmd", required=True)
+
+    b = sub.add_parser("build", help="build a workload from the ledger and an optional request log")
+    b.add_argument("--ledger", action="append", help="ledger JSONL file, repeatable (default: all ledger shards)")
+    b.add_argument("--requests", help="sanitized request log (NDJSON)")
+    b.add_argument("--default-size", type=int, default=DEFAULT_SIZE, help="content bytes when the request log has no sizes")
+    b.add_argument("--max-ops", type=int, default=None, help="keep only the first N ops")
+    b.add_argument("--seed", type=int, default=0, help="seed for size sampling")
+    b.add_argument("--out", required=True, help="workload JSON to write")
+
+    tolerances = argparse.ArgumentParser(add_help=False)
+    tolerances.add_argument("--throughput-tol", type=float, default=0.10, help="allowed throughput drop (fraction)")
+    tolerances.add_argument("--latency-tol", type=float, default=0.25, help="allowed p50/p95 latency growth (fraction)")
+    tolerances.add_argument("--latency-floor-ms", type=float, default=1.0, help="ignore latency growth below this many ms")
+
+    replay = argparse.ArgumentParser(add_help=False)
+    replay.add_argument("workload", help="workload JSON from 'build'")
+    replay.add_argument("--url", help="replay against a running server instead of in-process")
+    replay.add_argument("--concurrency", type=int, default=1, help="requests in flight")
+    replay.add_argument("--speed", type=float, default=0.0, help="pace by recorded timing at this speed-up (0 = as fast as possible)")
+
+    r = sub.add_parser("run", parents=[replay], help="replay a workload and write the run summary")
+    r.add_argument("--out", required=True, help="run summary JSON to write")
+
+    c = sub.add_parser("compare", parents=[tolerances], help="diff a run against a baseline run")
+    c.add_argument("baseline")
+    c.add_argument("current")
+
+    g = sub.add_parser("gate", parents=[replay, tolerances], help="run, then compare against the baseline")
+    g.add_argument("--baseline", required=True, help="baseline run summary")
+    g.add_argument("--update-baseline", action="store_true", help="write this run as the new baseline")
+    g.add_argument("--out", help="also write this run's summary here")
+
+    args = parser.parse_args(argv)
+    if args.cmd == "build":
+        workload = build_workload(args.ledger or ledger.ledger_files(), args.requests,
+                                  default_size=args.default_size, seed=args.seed, max_ops=args.max_ops)
+        _dump(workload, args.out)
+        print(json.dumps({"ops": len(workload["ops"]), "stats": workload["stats"]}, indent=2))
+        return 0
+
+    tol = {}
+    if args.cmd in ("compare", "gate"):
+        tol = {"throughput_tol": args.throughput_tol, "latency_tol": args.latency_tol,
+               "latency_floor_ms": args.latency_floor_ms}
+    if args.cmd == "compare":
+        return report(_load(args.baseline), _load(args.current), **tol)
+
+    result = run_workload(_load(args.workload), url=args.url, concurrency=args.concurrency, speed=args.speed)
+    if args.out:
+        _dump(result, args.out)
+    if args.cmd == "run":
+        print(json.dumps({k: result[k] for k in ("ops", "wall_s", "throughput_ops_s")}))
+        return 0
+    if args.update_baseline or not os.path.exists(args.baseline):
+        _dump(result, args.baseline)
+        print(f"baseline written to {args.baseline}")
+        return 0
+    return report(_load(args.baseline), result, **tol)
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -49,7 +49,11 @@ def _read_env_bytes(var_name: str) -> bytes | None:
     val = os.getenv(var_name)
     if not val:
         return None
-    # Try hex, then base64, else raw utf-8
+    return parse_secret(val)
+
+
+def parse_secret(val: str) -> bytes:
+    """Decode a configured secret: hex, then base64, else raw utf-8."""
     try:
         return bytes.fromhex(val)
     except Exception:
@@ -4,19 +4,22 @@ Seed-aware detector for Variant A, plus legacy detector kept for compatibility.
 """
 
 import hashlib
+from typing import Union
 
 
 def _tag_from_key(key: bytes) -> str:
     return hashlib.sha256(key).hexdigest()[:16]
 
 
-def detect_with_key(content: str, key: bytes):
+def detect_with_key(content: Union[str, bytes], key: bytes):
     """Deterministically detect watermark by recomputing expected tag.
 
+    ``content`` may be text or its UTF-8 bytes (raw-body endpoints).
     Returns: { statistic: float, pvalue: float, present: bool }
     """
     tag = _tag_from_key(key)
-    present = f"[wm:{tag}]" in content
+    marker = f"[wm:{tag}]"
+    present = (marker.encode() if isinstance(content, bytes) else marker) in content
     return {
         "statistic": 1.0 if present else 0.0,
         "pvalue": 0.01 if present else 1.0,
@@ -25,7 +28,7 @@ def detect_with_key(content: str, key: bytes):
 
 
 # --- Backward-compatible detector (used by current endpoints) ---
-def detect_text(content: str, commitment: str, server_salt: bytes):
+def detect_text(content: Union[str, bytes], commitment: str, server_salt: bytes):
     # Legacy detector cannot recover the seed; it only checks the pattern exists.
-    present = "[wm:" in content
+    present = (b"[wm:" if isinstance(content, bytes) else "[wm:") in content
     return {"statistic": 1.0 if present else 0.0, "pvalue": 0.01 if present else 1.0}
@@ -9,7 +9,7 @@ import hashlib
 import io
 import secrets
 from pathlib import Path
-from typing import Dict, Optional, Tuple, Union
+from typing import AsyncIterator, Dict, Optional, Tuple, Union
 from urllib.request import urlopen
 
 from PIL import Image
@@ -134,15 +134,37 @@ def _tag_from_key(key: bytes) -> str:
     return hashlib.sha256(key).hexdigest()[:16]
 
 
+def watermark_suffix(key: bytes) -> Tuple[str, str]:
+    """Return the marker appended to the text for ``key``.
+
+    Lets callers holding raw bytes append the encoded suffix themselves.
+    Returns: (suffix, tag_hex)
+    """
+    tag = _tag_from_key(key)
+    zwsp = "\u200b"
+    return f"{zwsp}[wm:{tag}]", tag
+
+
 def embed_with_key(text: str, key: bytes) -> Tuple[str, str]:
     """Embed using a deterministic key.
 
     Returns: (watermarked_text, tag_hex)
     """
-    tag = _tag_from_key(key)
-    zwsp = "\u200b"
-    watermarked = f"{text}{zwsp}[wm:{tag}]"
-    return watermarked, tag
+    suffix, tag = watermark_suffix(key)
+    return text + suffix, tag
+
+
+async def embed_stream(chunks: AsyncIterator[bytes], key: bytes) -> AsyncIterator[bytes]:
+    """Streaming counterpart of :func:`embed_with_key` over UTF-8 byte chunks.
+
+    Passes chunks through unchanged and emits the encoded marker at the end,
+    so the full text is never held in memory.
+    """
+    async for chunk in chunks:
+        if chunk:
+            yield chunk
+    suffix, _tag = watermark_suffix(key)
+    yield suffix.encode()
 
 
 # --- Backward-compatible function (used by current endpoints) ---
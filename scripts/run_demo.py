@@ -1,9 +1,8 @@
-import hashlib, json
+import hashlib, json, sys
 from fastapi.testclient import TestClient
 from app.main import app
 from app.pow import validate_pow
-
-client = TestClient(app)
+from app.utils import now_ms
 
 def sha256_hex(b: bytes) -> str:
     return hashlib.sha256(b).hexdigest()
@@ -12,22 +11,26 @@ def leading_zero_bits(hexh: str) -> int:
     bits = bin(int(hexh, 16))[2:].zfill(256)
     return len(bits) - len(bits.lstrip('0'))
 
-def solve_pow(client_id: str, endpoint: str, body_hash: str, difficulty: int=8) -> str:
+def solve_pow(client_id: str, endpoint: str, body_hash: str, difficulty: int=8, expires_at: int=None) -> str:
+    # The expiry is bound into the PoW, so every run solves a fresh ticket
+    suffix = f"|{expires_at}" if expires_at is not None else ""
     nonce = 0
     while True:
-        h = hashlib.sha256(f"{client_id}|{endpoint}|{body_hash}|{nonce}".encode()).hexdigest()
+        h = hashlib.sha256(f"{client_id}|{endpoint}|{body_hash}|{nonce}{suffix}".encode()).hexdigest()
         if leading_zero_bits(h) >= difficulty:
             return str(nonce)
         nonce += 1
 
-def main():
+def main() -> int:
     text = 'Hello Variant A — demo run'
     client_id = 'alice'
     endpoint = '/issue'
     body_hash = sha256_hex(text.encode())
     difficulty = 8
-    nonce = solve_pow(client_id, endpoint, body_hash, difficulty)
-    assert validate_pow(client_id, endpoint, body_hash, nonce, difficulty)
+    # A ticket buys one request: expire it well inside the replay window
+    expires_at = now_ms() + 5 * 60 * 1000
+    nonce = solve_pow(client_id, endpoint, body_hash, difficulty, expires_at)
+    assert validate_pow(client_id, endpoint, body_hash, nonce, difficulty, expires_at)
 
     issue_payload = {
         'content': text,
@@ -38,22 +41,29 @@ def main():
             'body_hash': body_hash,
             'nonce': nonce,
             'difficulty': difficulty,
+            'expires_at': expires_at,
         }
     }
-    issue_resp = client.post('/issue_v2', json=issue_payload)
-    print('ISSUE_V2 status:', issue_resp.status_code)
-    data = issue_resp.json()
-    print('ISSUE_V2 json:', json.dumps(data, indent=2))
-    wm = data['watermarked']
+    with TestClient(app) as client:
+        issue_resp = client.post('/issue_v2', json=issue_payload)
+        print('ISSUE_V2 status:', issue_resp.status_code)
+        data = issue_resp.json()
+        print('ISSUE_V2 json:', json.dumps(data, indent=2))
+        if issue_resp.status_code != 200:
+            # e.g. 409: this ticket was already used; 429: quota exceeded
+            print('ISSUE_V2 failed:', data.get('detail'))
+            return 1
+        wm = data['watermarked']
 
-    verify_payload = {
-        'content': wm,
-        'client_id': client_id,
-        'ticket': issue_payload['ticket'],
-    }
-    verify_resp = client.post('/verify_v2', json=verify_payload)
+        verify_payload = {
+            'content': wm,
+            'client_id': client_id,
+            'ticket': issue_payload['ticket'],
+        }
+        verify_resp = client.post('/verify_v2', json=verify_payload)
     print('VERIFY_V2 status:', verify_resp.status_code)
     print('VERIFY_V2 json:', json.dumps(verify_resp.json(), indent=2))
+    return 0 if verify_resp.status_code == 200 else 1
 
 if __name__ == '__main__':
-    main()
+    sys.exit(main())
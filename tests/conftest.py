@@ -0,0 +1,9 @@
+import pytest
+from app import main
+from app.replay import ReplayFilter
+
+
+@pytest.fixture(autouse=True)
+def fresh_replay_filter(monkeypatch):
+    # Tests reuse fixed tickets across test functions
+    monkeypatch.setattr(main, "replay_filter", ReplayFilter(window_s=3600, capacity=10_000))
@@ -0,0 +1,53 @@
+import json
+from app import ledger
+from app.audit import audit_ledger, main
+from app.utils import hmac_sign_bytes, canonical_json
+
+KEY = b"k" * 32
+
+
+def write_ledger(path, n: int=40):
+    lines = []
+    for i in range(n):
+        rec = {"type": "issue", "ts": i, "client_id": "a", "commitment": f"c{i}", "policy_v": 1}
+        rec["sig"] = hmac_sign_bytes(KEY, canonical_json(rec))
+        lines.append(json.dumps({"txid": ledger.compute_txid(rec), **rec}) + "\n")
+    path.write_text("".join(lines), encoding="utf-8")
+    return lines
+
+
+def test_audit_intact_ledger_across_chunks(tmp_path):
+    path = tmp_path / "log.jsonl"
+    write_ledger(path)
+    s = audit_ledger(str(path), KEY, workers=2, chunk_bytes=300)
+    assert s["intact"] and s["records"] == 40 and s["ok"] == 40
+
+
+def test_audit_flags_tampering_and_torn_lines(tmp_path):
+    path = tmp_path / "log.jsonl"
+    lines = write_ledger(path, 10)
+    lines[3] = lines[3].replace('"c3"', '"cX"')
+    legacy = {"type": "verify", "ts": 1, "decision": True}
+    legacy["transcript_sig"] = "0" * 64
+    lines.append(json.dumps({"txid": ledger.compute_txid(legacy), **legacy}) + "\n")
+    lines.append('{"txid": "t", "type": "iss')
+    path.write_text("".join(lines), encoding="utf-8")
+
+    s = audit_ledger(str(path), KEY, workers=2, chunk_bytes=256)
+    assert not s["intact"]
+    assert (s["records"], s["bad_txid"], s["bad_sig"], s["torn"]) == (11, 1, 2, 1)
+    kinds = {(i["kind"], i["txid"]) for i in s["issues"]}
+    assert ("bad_sig", json.loads(lines[10])["txid"]) in kinds
+
+
+def test_audit_resumes_from_checkpoint(tmp_path, capsys):
+    path = tmp_path / "log.jsonl"
+    write_ledger(path)
+    ckpt = str(tmp_path / "audit.json")
+    first = audit_ledger(str(path), KEY, workers=1, chunk_bytes=1024, checkpoint=ckpt)
+    again = audit_ledger(str(path), KEY, workers=1, chunk_bytes=1024, checkpoint=ckpt)
+    assert again["resumed_bytes"] == again["bytes"]
+    assert again["records"] == first["records"] == 40
+
+    assert main(["--ledger", str(path), "--key", KEY.hex(), "--workers", "1"]) == 0
+    assert json.loads(capsys.readouterr().out)["intact"] is True
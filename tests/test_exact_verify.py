@@ -0,0 +1,53 @@
+import hashlib
+from fastapi.testclient import TestClient
+from app import ledger, main
+from app.utils import hmac_sign
+
+
+client = TestClient(main.app)
+
+
+def issue(content: str) -> dict:
+    bh = hashlib.sha256(content.encode()).hexdigest()
+    ticket = {"client_id": "hana", "endpoint": "/issue", "body_hash": bh, "nonce": "0", "difficulty": 0}
+    r = client.post("/issue_v2", json={"content": content, "ticket": ticket})
+    assert r.status_code == 200, r.text
+    return r.json()
+
+
+def test_exact_copy_matches_streamed_body(tmp_path, monkeypatch):
+    monkeypatch.setattr(ledger, "LEDGER_PATH", str(tmp_path / "log.jsonl"))
+    issued = issue("exact copy " * 1000)
+    out = issued["watermarked"].encode()
+    chunks = [out[i:i + 4096] for i in range(0, len(out), 4096)]
+
+    r = client.post(
+        "/verify_v2/exact",
+        content=iter(chunks),
+        headers={"Content-Type": "application/octet-stream", "X-Client-Id": "ivan"},
+    )
+    assert r.status_code == 200, r.text
+    body = r.json()
+    assert body["match"] is True
+    assert body["receipt"] == issued["receipt"]
+    sig = body.pop("sig")
+    assert sig == hmac_sign(body)
+    # No detection transcript is written
+    assert sum(1 for _ in open(ledger.LEDGER_PATH)) == 1
+
+    by_hash = client.post("/verify_v2/exact", params={"output_hash": hashlib.sha256(out).hexdigest()},
+                          headers={"X-Client-Id": "ivan"})
+    assert by_hash.json()["receipt"]["txid"] == issued["receipt"]["txid"]
+
+
+def test_modified_content_does_not_match(tmp_path, monkeypatch):
+    monkeypatch.setattr(ledger, "LEDGER_PATH", str(tmp_path / "log.jsonl"))
+    issued = issue("edited later")
+    r = client.post(
+        "/verify_v2/exact",
+        content=(issued["watermarked"] + " ").encode(),
+        headers={"Content-Type": "text/plain", "X-Client-Id": "ivan"},
+    )
+    assert r.status_code == 200 and r.json()["match"] is False and r.json()["receipt"] is None
+    assert client.post("/verify_v2/exact", params={"output_hash": "xyz"}, headers={"X-Client-Id": "ivan"}).status_code == 422
+    assert client.post("/verify_v2/exact", content=b"x", headers={"Content-Type": "text/plain"}).status_code == 400
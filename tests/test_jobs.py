@@ -0,0 +1,166 @@
+import json
+import os
+import time
+from fastapi.testclient import TestClient
+from app import main, ledger
+from app.jobs import OUTSIDE_ROOT, JobManager, iter_items
+from app.pow import derive_seed
+from app.utils import get_server_salt
+from app.watermark.embed import embed_with_key
+
+
+client = TestClient(main.app)
+
+
+def ticket_for(i: int):
+    return {"client_id": "bulk", "endpoint": "/issue", "body_hash": f"{i:064x}", "nonce": "0", "difficulty": 0}
+
+
+def make_corpus(tmp_path, n: int=6):
+    salt = get_server_salt()
+    lines = []
+    for i in range(n):
+        wm, _ = embed_with_key(f"document {i}", derive_seed(ticket_for(i), salt))
+        lines.append({"id": f"d{i}", "content": wm, "ticket": ticket_for(i)})
+    # Plain text verified by txid, and one line with no evidence
+    txid = ledger.append_record({"type": "issue", "ts": 1, "client_id": "bulk", "commitment": "c", "ticket_hash": "t", "output_hash": "o", "policy_v": 1})
+    lines.append({"id": "plain", "content": "no mark here", "txid": txid})
+    lines.append({"id": "bare", "content": "x"})
+    src = tmp_path / "corpus.ndjson"
+    src.write_text("".join(json.dumps(l) + "\n" for l in lines), encoding="utf-8")
+    return src
+
+
+def read_results(mgr, job_id):
+    with open(mgr.results_path(job_id), encoding="utf-8") as f:
+        return [json.loads(l) for l in f]
+
+
+def test_bulk_job_via_api(tmp_path, monkeypatch):
+    monkeypatch.setattr(ledger, "LEDGER_PATH", str(tmp_path / "log.jsonl"))
+    monkeypatch.setattr(main, "jobs", JobManager(jobs_dir=str(tmp_path / "jobs"), workers=2))
+    monkeypatch.setenv("JOBS_SOURCE_ROOT", str(tmp_path))
+    src = make_corpus(tmp_path)
+    r = client.post("/jobs/verify", json={"source": str(src), "client_id": "bulk", "transcripts": True, "batch_size": 3})
+    assert r.status_code == 202, r.text
+    job_id = r.json()["job_id"]
+    for _ in range(600):
+        state = client.get(f"/jobs/{job_id}").json()
+        if state["status"] in ("done", "failed"):
+            break
+        time.sleep(0.1)
+    assert state["status"] == "done", state
+    assert (state["done"], state["present"], state["absent"], state["errors"]) == (8, 6, 1, 1)
+
+    rows = [json.loads(l) for l in client.get(f"/jobs/{job_id}/results").text.splitlines()]
+    assert [r["id"] for r in rows] == [f"d{i}" for i in range(6)] + ["plain", "bare"]
+    assert all("txid" in r for r in rows if "error" not in r)
+    assert ledger.find_commitment_by_txid(rows[0]["txid"]) is None  # transcripts are not issue records
+    summary = json.loads((tmp_path / "jobs" / job_id / "summary.json").read_text())
+    assert summary["txid"] == state["summary_txid"] and summary["transcript"]["documents"] == 8
+
+
+def test_bulk_job_resumes_from_checkpoint(tmp_path, monkeypatch):
+    monkeypatch.setattr(ledger, "LEDGER_PATH", str(tmp_path / "log.jsonl"))
+    src = make_corpus(tmp_path)
+    mgr = JobManager(jobs_dir=str(tmp_path / "jobs"), workers=1)
+    mgr.start = lambda: None  # run synchronously below
+    job_id = mgr.submit({"source": str(src), "format": "ndjson", "client_id": "bulk", "evidence": {}, "batch_size": 2})
+
+    # Simulate a crash after the first checkpoint, with a half-written batch after it
+    first = '{"id": "d0", "present": true}\n{"id": "d1", "present": true}\n'
+    with open(mgr.results_path(job_id), "w", encoding="utf-8") as f:
+        f.write(first + '{"id": "d2", "pres')
+    state = mgr.status(job_id)
+    state.update(status="running", total=8, done=2, present=2, results_offset=len(first))
+    mgr._save_state(job_id, state)
+
+    assert mgr.resume() == [job_id]
+    final = mgr.run_job(job_id)
+    assert final["status"] == "done" and final["done"] == 8
+    assert [r["id"] for r in read_results(mgr, job_id)] == [f"d{i}" for i in range(6)] + ["plain", "bare"]
+
+
+def test_documents_outside_source_root_are_refused(tmp_path, monkeypatch):
+    root = tmp_path / "root"
+    (root / "docs").mkdir(parents=True)
+    outside = tmp_path / "outside"
+    outside.mkdir()
+    (outside / "secret.txt").write_text("secret", encoding="utf-8")
+    (root / "docs" / "ok.txt").write_text("fine", encoding="utf-8")
+    (root / "docs" / "link.txt").symlink_to(outside / "secret.txt")
+    (root / "docs" / "ok.txt.ticket.json").symlink_to(outside / "secret.txt")
+    (root / "docs" / "plain.txt").write_text("fine", encoding="utf-8")
+    src = root / "corpus.ndjson"
+    src.write_text("".join(json.dumps({"id": i, "path": p, "commitment": "c"}) + "\n" for i, p in enumerate(
+        ["docs/plain.txt", "../outside/secret.txt", str(outside / "secret.txt"), "docs/link.txt"])), encoding="utf-8")
+    monkeypatch.setenv("JOBS_SOURCE_ROOT", str(root))
+
+    items = list(iter_items({"source": str(src), "format": "ndjson"}, lambda txid: None))
+    assert "error" not in items[0] and items[0]["path"] == str(root / "docs" / "plain.txt")
+    assert [i.get("error") for i in items[1:]] == [OUTSIDE_ROOT] * 3
+
+    by_name = {i["id"]: i for i in iter_items({"source": str(root / "docs"), "format": "dir", "evidence": {"commitment": "c"}}, lambda txid: None)}
+    assert by_name["link.txt"]["error"] == OUTSIDE_ROOT  # symlinked document
+    assert by_name["ok.txt"]["error"] == OUTSIDE_ROOT  # symlinked sidecar
+    assert "error" not in by_name["plain.txt"]
+
+    # The source itself must be inside the root (default: data/corpus)
+    r = client.post("/jobs/verify", json={"source": str(outside), "client_id": "bulk"})
+    assert r.status_code == 400
+    monkeypatch.delenv("JOBS_SOURCE_ROOT")
+    assert client.post("/jobs/verify", json={"source": str(src), "client_id": "bulk"}).status_code == 400
+
+
+def test_job_locked_by_another_worker_is_skipped(tmp_path, monkeypatch):
+    monkeypatch.setattr(ledger, "LEDGER_PATH", str(tmp_path / "log.jsonl"))
+    src = make_corpus(tmp_path)
+    mgr = JobManager(jobs_dir=str(tmp_path / "jobs"), workers=1)
+    mgr.start = lambda: None
+    job_id = mgr.submit({"source": str(src), "format": "ndjson", "client_id": "bulk", "evidence": {}, "batch_size": 4})
+
+    # Another server worker that resumed the same job holds its lock
+    other = JobManager(jobs_dir=str(tmp_path / "jobs"), workers=1)
+    with other._job_lock(job_id) as owned:
+        assert owned
+        assert mgr.run_job(job_id)["status"] == "queued"
+        assert not os.path.exists(mgr.results_path(job_id))
+    assert mgr.run_job(job_id)["status"] == "done"
+
+
+def test_bad_lines_and_sidecars_are_per_document_errors(tmp_path, monkeypatch):
+    monkeypatch.setattr(ledger, "LEDGER_PATH", str(tmp_path / "log.jsonl"))
+    monkeypatch.setenv("JOBS_SOURCE_ROOT", str(tmp_path))
+    src = tmp_path / "corpus.ndjson"
+    src.write_text('[1, 2]\n"text"\n{"id": "ok", "content": "x", "commitment": "c"}\n', encoding="utf-8")
+    docs = tmp_path / "docs"
+    docs.mkdir()
+    for name, sidecar in (("a.txt", "{not json"), ("b.txt", "[1]"), ("c.txt", '{"commitment": "c"}')):
+        (docs / name).write_text("x", encoding="utf-8")
+        (docs / (name + ".ticket.json")).write_text(sidecar, encoding="utf-8")
+
+    mgr = JobManager(jobs_dir=str(tmp_path / "jobs"), workers=1)
+    mgr.start = lambda: None
+    for source, fmt in ((src, "ndjson"), (docs, "dir")):
+        job_id = mgr.submit({"source": str(source), "format": fmt, "client_id": "bulk", "evidence": {}})
+        final = mgr.run_job(job_id)
+        assert final["status"] == "done", final
+        assert (final["done"], final["errors"]) == (3, 2)
+        assert "error" not in read_results(mgr, job_id)[2]
+
+
+def test_failed_job_can_be_retried(tmp_path, monkeypatch):
+    monkeypatch.setattr(ledger, "LEDGER_PATH", str(tmp_path / "log.jsonl"))
+    monkeypatch.setattr(main, "jobs", JobManager(jobs_dir=str(tmp_path / "jobs"), workers=1))
+    main.jobs.start = lambda: None
+    src = make_corpus(tmp_path)
+    job_id = main.jobs.submit({"source": str(src), "format": "ndjson", "client_id": "bulk", "evidence": {}})
+    src.rename(tmp_path / "moved.ndjson")  # e.g. the corpus is briefly unavailable
+    assert main.jobs.run_job(job_id)["status"] == "failed"
+
+    (tmp_path / "moved.ndjson").rename(src)
+    r = client.post(f"/jobs/{job_id}/retry")
+    assert r.status_code == 200 and r.json()["status"] == "queued"
+    assert main.jobs.run_job(job_id)["status"] == "done"
+    assert client.post(f"/jobs/{job_id}/retry").status_code == 409
+    assert client.post("/jobs/nope/retry").status_code == 404
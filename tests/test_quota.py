@@ -0,0 +1,85 @@
+import hashlib
+import os
+from fastapi.testclient import TestClient
+from app import main
+from app.quota import QuotaTracker
+
+
+client = TestClient(main.app)
+
+
+class FakeClock:
+    def __init__(self, t: float=1000.0):
+        self.t = t
+
+    def __call__(self) -> float:
+        return self.t
+
+
+def test_sliding_window_limits_and_recovers():
+    clock = FakeClock(600.0)  # start of a window
+    q = QuotaTracker({"/issue": 3, "/verify": 0}, window_s=60, clock=clock)
+    assert [q.hit("a", "/issue") for _ in range(3)] == [None, None, None]
+    retry = q.hit("a", "/issue")
+    assert retry is not None and retry > 0
+    # Other clients and unlimited endpoints are unaffected
+    assert q.hit("b", "/issue") is None
+    assert q.hit("a", "/verify") is None
+    # Halfway into the next window, half of the previous window still counts
+    clock.t += 90
+    assert [q.hit("a", "/issue") for _ in range(2)] == [None, None]
+    assert q.hit("a", "/issue") is not None
+    assert q.usage("a")["/issue"]["remaining"] == 0
+
+
+def test_idle_and_overflow_eviction():
+    clock = FakeClock()
+    q = QuotaTracker({"/issue": 5}, window_s=10, max_clients=3, clock=clock)
+    for cid in ("a", "b", "c", "d"):
+        q.hit(cid, "/issue")
+    assert len(q) == 3 and q.usage("a")["/issue"]["used"] == 0
+    clock.t += 25
+    q.hit("e", "/issue")
+    assert len(q) == 1
+
+
+def test_snapshot_roundtrip(tmp_path):
+    clock = FakeClock()
+    q = QuotaTracker({"/issue": 2}, window_s=60, clock=clock)
+    q.hit("a", "/issue")
+    q.hit("a", "/issue")
+    path = str(tmp_path / "quota.json")
+    q.save(path)
+    restored = QuotaTracker({"/issue": 2}, window_s=60, clock=clock)
+    assert restored.load(path) == 1
+    assert restored.hit("a", "/issue") is not None
+
+
+def test_workers_saving_to_one_snapshot_merge(tmp_path):
+    clock = FakeClock()
+    path = str(tmp_path / "quota.json")
+    workers = [QuotaTracker({"/issue": 3}, window_s=60, clock=clock) for _ in range(2)]
+    for cid in ("a", "a", "b"):
+        workers[0].hit(cid, "/issue")
+    for cid in ("a", "c"):
+        workers[1].hit(cid, "/issue")
+    for w in workers:
+        w.save(path)
+
+    restored = QuotaTracker({"/issue": 3}, window_s=60, clock=clock)
+    assert restored.load(path) == 3  # no worker's clients are lost
+    assert restored.usage("a")["/issue"]["used"] == 2  # the higher count wins
+    assert sorted(os.listdir(tmp_path)) == ["quota.json", "quota.json.lock"]
+
+
+def test_issue_rejected_with_429_before_ledger(monkeypatch):
+    monkeypatch.setattr(main, "quotas", QuotaTracker({"/issue": 1, "/verify": 1}))
+    appended = []
+    monkeypatch.setattr(main.ledger, "append_record", lambda rec: appended.append(rec) or "tx")
+    bh = hashlib.sha256(b"q").hexdigest()
+    ticket = {"client_id": "dave", "endpoint": "/issue", "body_hash": bh, "nonce": "0", "difficulty": 0}
+    assert client.post("/issue_v2", json={"content": "q", "ticket": ticket}).status_code == 200
+    r = client.post("/issue_v2", json={"content": "q", "ticket": ticket})
+    assert r.status_code == 429 and "Retry-After" in r.headers
+    assert len(appended) == 1
+    assert client.get("/quota/dave").json()["usage"]["/issue"]["remaining"] == 0
@@ -0,0 +1,73 @@
+import hashlib
+import json
+from fastapi.testclient import TestClient
+from app import main
+from app.main import app
+
+
+client = TestClient(app)
+
+
+def sha256_hex(b: bytes) -> str:
+    return hashlib.sha256(b).hexdigest()
+
+
+def solve_pow(client_id: str, endpoint: str, body_hash: str, difficulty: int=8):
+    nonce = 0
+    while True:
+        h = hashlib.sha256(f"{client_id}|{endpoint}|{body_hash}|{nonce}".encode()).hexdigest()
+        bits = bin(int(h, 16))[2:].zfill(256)
+        if len(bits) - len(bits.lstrip('0')) >= difficulty:
+            return str(nonce)
+        nonce += 1
+
+
+def make_ticket(client_id: str, content: bytes, difficulty: int=8):
+    bh = sha256_hex(content)
+    return {
+        "client_id": client_id,
+        "endpoint": "/issue",
+        "body_hash": bh,
+        "nonce": solve_pow(client_id, "/issue", bh, difficulty),
+        "difficulty": difficulty,
+    }
+
+
+def test_issue_raw_matches_json_issue(monkeypatch):
+    monkeypatch.setattr(main, "replay_filter", None)  # the same ticket is sent twice
+    content = "raw body ✓ ".encode() * 1000
+    ticket = make_ticket("carol", content)
+    r = client.post(
+        "/issue_v2/raw",
+        content=content,
+        headers={"Content-Type": "application/octet-stream", "X-Ticket": json.dumps(ticket)},
+    )
+    assert r.status_code == 200, r.text
+    assert r.content.startswith(content)
+    for h in ("X-Receipt-Commitment", "X-Receipt-Txid", "X-Receipt-Ticket-Hash", "X-Receipt-Timestamp", "X-Receipt-Sig"):
+        assert h in r.headers
+
+    # Same ticket through the JSON endpoint yields the same watermark and commitment
+    j = client.post("/issue_v2", json={"content": content.decode(), "ticket": ticket})
+    assert j.status_code == 200, j.text
+    assert j.json()["watermarked"].encode() == r.content
+    assert j.json()["receipt"]["commitment"] == r.headers["X-Receipt-Commitment"]
+
+    v = client.post(
+        "/verify_v2/raw",
+        content=r.content,
+        headers={"Content-Type": "text/plain; charset=utf-8", "X-Client-Id": "carol", "X-Ticket": json.dumps(ticket)},
+    )
+    assert v.status_code == 200, v.text
+    data = v.json()
+    assert data["detection"]["present"] is True
+    assert data["transcript"]["content_hash"] == sha256_hex(r.content)
+
+
+def test_raw_endpoints_reject_bad_requests():
+    r = client.post("/issue_v2/raw", json={"content": "x"})
+    assert r.status_code == 415
+    r = client.post("/issue_v2/raw", content=b"x", headers={"Content-Type": "text/plain"})
+    assert r.status_code == 400
+    r = client.post("/verify_v2/raw", content=b"x", headers={"Content-Type": "text/plain", "X-Client-Id": "carol", "X-Ticket": "{"})
+    assert r.status_code == 400
@@ -0,0 +1,95 @@
+import hashlib
+import json
+import uuid
+from fastapi.testclient import TestClient
+from app import ledger, main
+from app.pow import ticket_hash_hex, validate_pow
+from app.quota import QuotaTracker
+from app.replay import ReplayFilter
+from app.utils import now_ms
+
+
+client = TestClient(main.app)
+
+
+class FakeClock:
+    def __init__(self, t: float=1000.0):
+        self.t = t
+
+    def __call__(self) -> float:
+        return self.t
+
+
+def test_filter_remembers_for_window_then_forgets():
+    clock = FakeClock()
+    f = ReplayFilter(window_s=30, capacity=1000, slots=4, clock=clock)
+    assert f.check_and_add("aa" * 32) is False
+    assert f.check_and_add("aa" * 32) is True
+    assert f.check_and_add("bb" * 32) is False
+    clock.t += 30  # still inside the window
+    assert f.check_and_add("aa" * 32) is True
+    clock.t += 50  # every slot holding it has rotated out
+    assert f.check_and_add("aa" * 32) is False
+
+
+def test_shared_segment_is_seen_by_other_instances():
+    name = f"povpvw-test-{uuid.uuid4().hex[:8]}"
+    a = ReplayFilter(window_s=60, capacity=1000, name=name)
+    try:
+        b = ReplayFilter(window_s=60, capacity=1000, name=name)
+        assert a.check_and_add("cc" * 32) is False
+        assert b.check_and_add("cc" * 32) is True
+        b.close()
+    finally:
+        a.unlink()
+
+
+def test_replayed_ticket_rejected_before_ledger(tmp_path, monkeypatch):
+    monkeypatch.setattr(ledger, "LEDGER_PATH", str(tmp_path / "log.jsonl"))
+    bh = hashlib.sha256(b"once").hexdigest()
+    ticket = {"client_id": "frank", "endpoint": "/issue", "body_hash": bh, "nonce": "0", "difficulty": 0}
+    assert client.post("/issue_v2", json={"content": "once", "ticket": ticket}).status_code == 200
+    r = client.post(
+        "/issue_v2/raw",
+        content=b"once",
+        headers={"Content-Type": "application/octet-stream", "X-Ticket": json.dumps(ticket)},
+    )
+    assert r.status_code == 409
+    assert sum(1 for _ in open(ledger.LEDGER_PATH)) == 1
+
+
+def test_ticket_expiry_is_enforced_and_bound_into_pow(tmp_path, monkeypatch):
+    monkeypatch.setattr(ledger, "LEDGER_PATH", str(tmp_path / "log.jsonl"))
+    bh = hashlib.sha256(b"late").hexdigest()
+    expires_at = now_ms() + 60_000
+    assert validate_pow("g", "/issue", bh, "0", 0, expires_at)
+    ticket = {"client_id": "g", "endpoint": "/issue", "body_hash": bh, "nonce": "0", "difficulty": 0}
+    r = client.post("/issue_v2", json={"content": "late", "ticket": {**ticket, "expires_at": now_ms() - 1}})
+    assert r.status_code == 400 and "expired" in r.json()["detail"]
+    r = client.post("/issue_v2", json={"content": "late", "ticket": {**ticket, "expires_at": now_ms() + 10**9}})
+    assert r.status_code == 400 and "window" in r.json()["detail"]
+    ok = client.post("/issue_v2", json={"content": "late", "ticket": {**ticket, "expires_at": expires_at}})
+    assert ok.status_code == 200
+    # The expiry is part of the ticket hash (and so of the seed)
+    assert ok.json()["receipt"]["ticket_hash"] == ticket_hash_hex({**ticket, "expires_at": expires_at}) != ticket_hash_hex(ticket)
+
+
+def test_rejected_requests_keep_their_ticket(tmp_path, monkeypatch):
+    monkeypatch.setattr(ledger, "LEDGER_PATH", str(tmp_path / "log.jsonl"))
+    bh = hashlib.sha256(b"retry").hexdigest()
+    ticket = {"client_id": "ivy", "endpoint": "/issue", "body_hash": bh, "nonce": "0", "difficulty": 0}
+    # Over quota: 429, and the same ticket works once the quota allows it
+    monkeypatch.setattr(main, "quotas", QuotaTracker({"/issue": 1}))
+    main.quotas.hit("ivy", "/issue")
+    assert client.post("/issue_v2", json={"content": "retry", "ticket": ticket}).status_code == 429
+    monkeypatch.setattr(main, "quotas", QuotaTracker({}))
+    issued = client.post("/issue_v2", json={"content": "retry", "ticket": ticket})
+    assert issued.status_code == 200
+
+    # Unknown txid: 404, then the same verify PoW is still good
+    pow = {"body_hash": hashlib.sha256(b"retry").hexdigest(), "nonce": "1", "difficulty": 0}
+    body = {"content": issued.json()["watermarked"], "client_id": "ivy", "pow": pow}
+    assert client.post("/verify_v2", json={**body, "evidence": {"txid": "0" * 64}}).status_code == 404
+    txid = issued.json()["receipt"]["txid"]
+    assert client.post("/verify_v2", json={**body, "evidence": {"txid": txid}}).status_code == 200
+    assert client.post("/verify_v2", json={**body, "evidence": {"txid": txid}}).status_code == 409
@@ -0,0 +1,185 @@
+import os
+import time
+import pytest
+from fastapi.testclient import TestClient
+from app import main, ledger
+from app.rebalance import rebalance
+from app.replica import FEED_TOKEN_HEADER, LedgerReplica
+from app.utils import now_ms
+
+
+client = TestClient(main.app)
+FEED_TOKEN = "feed-secret"
+
+
+@pytest.fixture(autouse=True)
+def feed_token(monkeypatch):
+    monkeypatch.setenv("LEDGER_FEED_TOKEN", FEED_TOKEN)
+
+
+class InProcessReplica(LedgerReplica):
+    """Replica that reads the feed from the in-process primary app."""
+
+    def __init__(self, primary: TestClient, **kw):
+        self.primary = primary
+        super().__init__("http://primary", feed_token=FEED_TOKEN, **kw)
+
+    def _fetch(self, offset, wait, shard):
+        r = self.primary.get("/ledger/feed", params=self._feed_params(offset, wait, shard),
+                             headers={FEED_TOKEN_HEADER: self.feed_token})
+        assert r.status_code == 200, r.text
+        return r.content, {k.lower(): v for k, v in r.headers.items()}
+
+
+def issue_record(i: int):
+    return {"type": "issue", "ts": i, "client_id": "c", "commitment": f"c{i}", "ticket_hash": "t", "output_hash": "o", "policy_v": 1}
+
+
+def test_feed_returns_whole_records(tmp_path, monkeypatch):
+    monkeypatch.setattr(ledger, "LEDGER_PATH", str(tmp_path / "log.jsonl"))
+    ledger.append_record(issue_record(1))
+    with open(ledger.LEDGER_PATH, "a", encoding="utf-8") as f:
+        f.write('{"torn": ')  # record still being written
+    r = client.get("/ledger/feed", params={"offset": 0}, headers={FEED_TOKEN_HEADER: FEED_TOKEN})
+    assert r.content.endswith(b"\n") and r.content.count(b"\n") == 1
+    assert int(r.headers["X-Ledger-Next-Offset"]) == len(r.content)
+    assert client.get("/ledger/feed", params={"offset": 10**9}, headers={FEED_TOKEN_HEADER: FEED_TOKEN}).status_code == 416
+
+
+def test_feed_requires_the_replication_token(tmp_path, monkeypatch):
+    monkeypatch.setattr(ledger, "LEDGER_PATH", str(tmp_path / "log.jsonl"))
+    txid = ledger.append_record(issue_record(1))
+    assert client.get("/ledger/feed").status_code == 403
+    assert client.get("/ledger/feed", headers={FEED_TOKEN_HEADER: "guess"}).status_code == 403
+    monkeypatch.delenv("LEDGER_FEED_TOKEN")
+    assert client.get("/ledger/feed", headers={FEED_TOKEN_HEADER: ""}).status_code == 404
+
+    # Public lookups only return the receipt fields, never client ids, output hashes or signatures
+    r = client.get(f"/ledger/txid/{txid}")
+    assert r.status_code == 200
+    assert r.json() == {"commitment": "c1", "txid": txid, "ticket_hash": "t", "timestamp": 1}
+
+
+def test_replica_tails_primary_and_reports_lag(tmp_path, monkeypatch):
+    monkeypatch.setattr(ledger, "LEDGER_PATH", str(tmp_path / "log.jsonl"))
+    txids = [ledger.append_record(issue_record(i)) for i in range(3)]
+    ledger.append_record({"type": "verify", "ts": 9})
+
+    rep = InProcessReplica(client, mirror_path=str(tmp_path / "mirror.jsonl"))
+    rep.sync_once()
+    assert rep.lag()["bytes"] == 0 and rep.lag()["ms"] is not None
+    assert rep.find_commitment_by_txid(txids[1])["commitment"] == "c1"
+    assert rep.find_issue_by_commitment("c2")["txid"] == txids[2]
+    assert rep.find_issue_by_output_hash("o")["txid"] == txids[0]  # first issuance wins
+
+    # A txid appended after the last sync is found by the catch-up on miss
+    late = ledger.append_record(issue_record(7))
+    assert rep.find_commitment_by_txid(late)["commitment"] == "c7"
+
+    # Restart resumes from the mirror without re-reading the primary
+    restarted = InProcessReplica(client, mirror_path=str(tmp_path / "mirror.jsonl"))
+    assert restarted.indexes[0].offset == ledger.ledger_size()
+    assert restarted._find_txid(late) is not None
+
+    # In replica mode issuance is refused, lookups come from the index, lag is in headers
+    monkeypatch.setattr(main, "replica", rep)
+    replica_client = TestClient(main.ReplicationLagHeaders(main.app))  # installed at startup on replicas
+    r = replica_client.get(f"/ledger/txid/{txids[0]}")
+    assert r.status_code == 200 and r.json()["commitment"] == "c0"
+    assert r.headers["X-Replica-Lag-Bytes"] == "0"
+    ticket = {"client_id": "c", "endpoint": "/issue", "body_hash": "x", "nonce": "0", "difficulty": 0}
+    assert client.post("/issue_v2", json={"content": "x", "ticket": ticket}).status_code == 403
+
+
+def test_lookup_misses_do_not_flood_the_primary(tmp_path, monkeypatch):
+    monkeypatch.setattr(ledger, "LEDGER_PATH", str(tmp_path / "log.jsonl"))
+    ledger.append_record(issue_record(1))
+    rep = InProcessReplica(client, mirror_path=None, catchup_s=3600)
+    rep.sync_once()
+    fetches = []
+    fetch = rep._fetch
+    monkeypatch.setattr(rep, "_fetch", lambda *a: fetches.append(a) or fetch(*a))
+
+    # Exact-match misses (edited content) never reach the primary while caught up
+    for i in range(5):
+        assert rep.find_issue_by_output_hash(f"edited{i}") is None
+    assert fetches == []
+
+    # Other misses catch up at most once per catchup_s
+    late = ledger.append_record(issue_record(2))
+    assert rep.find_commitment_by_txid(late)["commitment"] == "c2"
+    for i in range(5):
+        assert rep.find_commitment_by_txid(f"missing{i}") is None
+    assert len(fetches) == 1
+
+
+def test_lag_ms_is_zero_when_caught_up_and_ages_when_behind(tmp_path, monkeypatch):
+    monkeypatch.setattr(ledger, "LEDGER_PATH", str(tmp_path / "log.jsonl"))
+    rep = InProcessReplica(client, mirror_path=None)
+    assert rep.lag()["ms"] is None  # never synced
+    ledger.append_record({**issue_record(1), "ts": now_ms() - 5000})
+    rep.sync_once()
+    time.sleep(0.02)
+    assert rep.lag() == {**rep.lag(), "bytes": 0, "ms": 0}
+
+    # The primary has moved on (as seen in a feed header) but nothing new is applied yet
+    ledger.append_record({**issue_record(2), "ts": now_ms()})
+    rep.primary_sizes[0] = ledger.ledger_size()
+    lag = rep.lag()
+    assert lag["bytes"] > 0 and lag["ms"] >= 5000
+    rep.sync_once()
+    assert rep.lag()["ms"] == 0
+
+
+def test_lag_grows_and_error_is_exposed_when_primary_is_unreachable(tmp_path, monkeypatch):
+    monkeypatch.setattr(ledger, "LEDGER_PATH", str(tmp_path / "log.jsonl"))
+    ledger.append_record({**issue_record(1), "ts": now_ms()})
+    rep = InProcessReplica(client, mirror_path=None, catchup_s=0)
+    rep.sync_once()
+    assert rep.lag()["ms"] == 0
+
+    def unreachable(*a):
+        raise OSError("Connection refused")
+
+    monkeypatch.setattr(rep, "_fetch", unreachable)
+    assert rep.find_commitment_by_txid("missing") is None  # the catch-up sync fails
+    rep.synced_at -= 60_000  # last successful sync a minute ago
+    lag = rep.lag()
+    assert lag["bytes"] == 0 and lag["ms"] >= 60_000 and "refused" in lag["error"]
+
+    monkeypatch.setattr(main, "replica", rep)
+    r = TestClient(main.ReplicationLagHeaders(main.app)).get("/")
+    assert int(r.headers["X-Replica-Lag-Ms"]) >= 60_000
+    assert r.headers["X-Replica-Error"] == "Connection refused"
+
+    # No error recorded, but no successful sync for longer than stale_s either
+    rep.last_error = None
+    assert rep.lag()["ms"] >= 60_000
+
+
+def test_replica_retails_after_rebalance(tmp_path, monkeypatch):
+    monkeypatch.setattr(ledger, "LEDGER_PATH", str(tmp_path / "log.jsonl"))
+    monkeypatch.setattr(ledger, "LEDGER_SHARD_DIR", str(tmp_path / "ledger"))
+    txids = [ledger.append_record({**issue_record(i), "client_id": f"c{i}"}) for i in range(6)]
+    mirror = str(tmp_path / "mirror.jsonl")
+    rep = InProcessReplica(client, mirror_path=mirror)
+    rep.sync_once()
+    assert rep.epoch == "0" and rep.lag()["bytes"] == 0
+
+    # Every file is rewritten: the old byte offsets mean nothing any more
+    stats = rebalance(2)
+    monkeypatch.setattr(ledger, "LEDGER_SHARDS", 2)
+    late = ledger.append_record({**issue_record(9), "client_id": "c9"})
+    rep.sync_once()
+    assert rep.epoch == stats["epoch"] and rep.shards == 2
+    assert rep.lag()["ms"] is None  # nothing known about the new epoch yet
+    rep.sync_once()
+    assert rep.lag()["bytes"] == 0
+    assert rep.indexes[0].offset + rep.indexes[1].offset == sum(os.path.getsize(p) for p in ledger.ledger_files())
+    for txid in txids + [late]:
+        assert rep._find_txid(txid) is not None
+
+    # A restarted replica keeps the epoch and its offsets
+    restarted = InProcessReplica(client, mirror_path=mirror)
+    assert restarted.epoch == stats["epoch"]
+    assert restarted.sync_once() == 0 and restarted.resets == 0
@@ -0,0 +1,55 @@
+import os
+from app import ledger
+from app.audit import audit_ledger
+from app.rebalance import rebalance
+from app.utils import get_server_key
+
+
+def configure(monkeypatch, tmp_path, shards: int):
+    monkeypatch.setattr(ledger, "LEDGER_PATH", str(tmp_path / "log.jsonl"))
+    monkeypatch.setattr(ledger, "LEDGER_SHARD_DIR", str(tmp_path / "ledger"))
+    monkeypatch.setattr(ledger, "LEDGER_SHARDS", shards)
+
+
+def issue(client_id: str, i: int):
+    return {"type": "issue", "ts": i, "client_id": client_id, "commitment": f"{client_id}-{i}", "policy_v": 1}
+
+
+def test_records_route_to_one_shard_by_client(tmp_path, monkeypatch):
+    configure(monkeypatch, tmp_path, 4)
+    txids = {c: ledger.append_record(issue(c, 1)) for c in ("a", "b", "c", "d", "e")}
+    batch = ledger.append_records([issue("a", 2), issue("b", 2)])
+
+    assert len(ledger.ledger_files()) == 4
+    for client_id, txid in txids.items():
+        assert txid[:ledger.ROUTE_HEX] == ledger.route_key(client_id)
+        expected = ledger.shard_of(ledger.route_key(client_id), 4)
+        assert ledger._shards_for_txid(txid) == [ledger.shards()[expected]]
+        assert ledger.find_commitment_by_txid(txid)["commitment"] == f"{client_id}-1"
+    assert ledger.find_commitment_by_txid(batch[1])["commitment"] == "b-2"
+    assert ledger.find_issue_by_commitment("e-1")["txid"] == txids["e"]
+    assert sum(audit_ledger(p, get_server_key(), workers=1)["bad_txid"] for p in ledger.ledger_files()) == 0
+
+
+def test_rebalance_keeps_txids_resolvable(tmp_path, monkeypatch):
+    # Start from a single-file ledger, shard it, then change the shard count
+    configure(monkeypatch, tmp_path, 1)
+    legacy = [ledger.append_record(issue(f"c{i}", i)) for i in range(10)]
+
+    stats = rebalance(3)
+    assert stats["records"] == 10 and not os.path.exists(tmp_path / "log.jsonl")
+    configure(monkeypatch, tmp_path, 3)
+    sharded = [ledger.append_record(issue(f"c{i}", 100 + i)) for i in range(10)]
+    for txid in legacy + sharded:
+        assert ledger.find_commitment_by_txid(txid) is not None
+
+    rebalance(5)
+    configure(monkeypatch, tmp_path, 5)
+    for txid in legacy + sharded:
+        assert ledger.find_commitment_by_txid(txid) is not None
+    # Each client's records live in exactly the shard its route maps to
+    for i, path in enumerate(ledger.ledger_files()):
+        with open(path, encoding="utf-8") as f:
+            for line in f:
+                client_id = line.split('"client_id": "')[1].split('"')[0]
+                assert ledger.shard_of(ledger.route_key(client_id), 5) == i
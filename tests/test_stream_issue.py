@@ -0,0 +1,106 @@
+import asyncio
+import hashlib
+import json
+from fastapi.testclient import TestClient
+from app.main import app
+from app import ledger, main
+from app.utils import hmac_sign
+
+
+client = TestClient(app)
+
+
+def test_stream_issue_finalizes_receipt_after_body(tmp_path, monkeypatch):
+    monkeypatch.setattr(ledger, "LEDGER_PATH", str(tmp_path / "log.jsonl"))
+    monkeypatch.setattr(main, "replay_filter", None)  # the same ticket is sent twice
+    chunks = [b"stream chunk %d\n" % i for i in range(200)]
+    content = b"".join(chunks)
+    bh = hashlib.sha256(content).hexdigest()
+    ticket = {"client_id": "erin", "endpoint": "/issue", "body_hash": bh, "nonce": "0", "difficulty": 0}
+
+    r = client.post(
+        "/issue_v2/stream",
+        content=iter(chunks),
+        headers={"Content-Type": "application/octet-stream", "X-Ticket": json.dumps(ticket)},
+    )
+    assert r.status_code == 200, r.text
+    assert r.content.startswith(content)
+
+    # Identical to the buffered endpoint for the same ticket
+    j = client.post("/issue_v2", json={"content": content.decode(), "ticket": ticket}).json()
+    assert j["watermarked"].encode() == r.content
+    assert j["receipt"]["commitment"] == r.headers["X-Receipt-Commitment"]
+
+    # Any worker can serve the receipt: it is rebuilt from the ledger by stream id
+    ledger._shard_sets.clear()
+    rc = client.get(r.headers["X-Receipt-Location"])
+    assert rc.status_code == 200, rc.text
+    receipt = rc.json()["receipt"]
+    assert receipt["commitment"] == r.headers["X-Receipt-Commitment"]
+    assert rc.json()["sig"] == hmac_sign(receipt)
+    rec = ledger.find_commitment_by_txid(receipt["txid"])
+    assert rec["output_hash"] == hashlib.sha256(r.content).hexdigest()
+
+
+def test_stream_receipt_is_this_streams_record_when_ticket_is_reused(tmp_path, monkeypatch):
+    monkeypatch.setattr(ledger, "LEDGER_PATH", str(tmp_path / "log.jsonl"))
+    monkeypatch.setattr(main, "replay_filter", None)  # e.g. REPLAY_WINDOW_S=0
+    ticket = {"client_id": "erin", "endpoint": "/issue", "body_hash": "ab" * 32, "nonce": "0", "difficulty": 0}
+    first = client.post("/issue_v2", json={"content": "content A", "ticket": ticket}).json()
+
+    r = client.post(
+        "/issue_v2/stream",
+        content=b"content B",
+        headers={"Content-Type": "application/octet-stream", "X-Ticket": json.dumps(ticket)},
+    )
+    assert r.headers["X-Receipt-Commitment"] == first["receipt"]["commitment"]
+    receipt = client.get(r.headers["X-Receipt-Location"]).json()["receipt"]
+    assert receipt["txid"] != first["receipt"]["txid"]
+    rec = ledger.find_commitment_by_txid(receipt["txid"])
+    assert rec["stream_id"] == r.headers["X-Receipt-Stream-Id"]
+    assert rec["output_hash"] == hashlib.sha256(r.content).hexdigest()
+
+
+def test_stream_receipt_unknown():
+    assert client.get("/issue_v2/stream/nope/receipt").status_code == 404
+
+
+def test_stream_issue_body_arrives_after_response_start(tmp_path, monkeypatch):
+    # TestClient sends the whole body up front; drive the ASGI app directly so
+    # most chunks arrive only after the response has started
+    monkeypatch.setattr(ledger, "LEDGER_PATH", str(tmp_path / "log.jsonl"))
+    chunks = [b"late chunk %d\n" % i for i in range(20)]
+    content = b"".join(chunks)
+    ticket = {"client_id": "erin", "endpoint": "/issue", "body_hash": hashlib.sha256(content).hexdigest(),
+              "nonce": "0", "difficulty": 0}
+    scope = {
+        "type": "http", "asgi": {"version": "3.0"}, "http_version": "1.1", "method": "POST",
+        "scheme": "http", "path": "/issue_v2/stream", "raw_path": b"/issue_v2/stream", "query_string": b"",
+        "root_path": "", "client": ("test", 1), "server": ("test", 80),
+        "headers": [(b"content-type", b"application/octet-stream"), (b"x-ticket", json.dumps(ticket).encode())],
+    }
+    started = asyncio.Event()
+    next_chunk = [0]
+
+    async def receive():
+        i = next_chunk[0]
+        next_chunk[0] += 1
+        if i >= len(chunks):
+            await asyncio.sleep(3600)  # the client never disconnects
+        if i > 0:
+            await started.wait()
+            await asyncio.sleep(0.01)
+        return {"type": "http.request", "body": chunks[i], "more_body": i + 1 < len(chunks)}
+
+    messages = []
+
+    async def send(message):
+        messages.append(message)
+        if message["type"] == "http.response.start":
+            started.set()
+
+    asyncio.run(asyncio.wait_for(main.app(scope, receive, send), 10))
+    assert messages[0]["status"] == 200
+    body = b"".join(m.get("body", b"") for m in messages[1:])
+    assert body.startswith(content)
+    assert sum(1 for _ in open(ledger.LEDGER_PATH)) == 1
@@ -0,0 +1,67 @@
+import copy
+import json
+from app import ledger, tracereplay
+
+
+def issue_record(i: int, client: str, ticket: str):
+    return {"type": "issue", "ts": 1000 + i, "client_id": client, "commitment": f"c{i}", "ticket_hash": ticket,
+            "output_hash": f"o{i}", "policy_v": 1, "sig": "s"}
+
+
+def test_build_and_replay_match_traffic_shape(tmp_path):
+    path = str(tmp_path / "log.jsonl")
+    tx0 = ledger.compute_txid(issue_record(0, "alice", "t0"))
+    with open(path, "w", encoding="utf-8") as f:
+        for rec in (
+            {"txid": tx0, **issue_record(0, "alice", "t0")},
+            {"txid": "x1", **issue_record(1, "bob", "t0")},  # same ticket again
+            {"txid": "x2", "type": "verify", "ts": 1005, "client_id": "carl", "commitment": "c0",
+             "content_hash": "o0", "ticket_hash": "t0", "sig": "s"},
+            {"txid": "x3", "type": "verify", "ts": 1006, "client_id": "carl", "commitment": "c0",
+             "content_hash": "edited", "sig": "s"},
+        ):
+            f.write(json.dumps(rec) + "\n")
+    requests = str(tmp_path / "requests.ndjson")
+    with open(requests, "w", encoding="utf-8") as f:
+        for entry in (
+            {"ts": 999, "path": "/issue_v2", "bytes": 300, "status": 200},
+            {"ts": 1007, "path": f"/ledger/txid/{tx0}", "bytes": 0, "status": 200},
+            {"ts": 1008, "path": "/ledger/txid/unknown", "bytes": 0, "status": 404},
+            {"ts": 1009, "path": "/verify_v2/exact", "bytes": 300, "txid": tx0},
+        ):
+            f.write(json.dumps(entry) + "\n")
+
+    workload = tracereplay.build_workload([path], requests)
+    ops = workload["ops"]
+    assert [op["kind"] for op in ops] == ["issue", "reissue", "verify", "verify", "lookup_txid", "lookup_txid", "verify_exact"]
+    assert ops[0]["size"] == 300 and ops[0]["client"] == "c0"
+    assert (ops[2]["mode"], ops[2]["exact"], ops[3]["mode"], ops[3]["exact"]) == ("ticket", True, "txid", False)
+    assert ops[4]["ref"] == 0 and ops[5]["ref"] is None
+    assert "alice" not in json.dumps(workload["ops"])
+
+    run = tracereplay.run_workload(workload, concurrency=2)
+    kinds = run["by_kind"]
+    assert kinds["issue /issue_v2"]["status"] == {"200": 1}
+    assert kinds["reissue"]["status"] == {"409": 1}
+    assert kinds["verify /verify_v2"]["outcomes"] == {"present": 2}
+    assert kinds["lookup_txid"]["status"] == {"200": 1, "404": 1}
+    assert kinds["verify_exact"]["outcomes"] == {"match": 1}
+    # The replay ran on a temporary ledger
+    assert sum(1 for _ in open(path)) == 4
+
+
+def test_compare_flags_regressions():
+    base = {"workload_sha256": "w", "settings": {}, "throughput_ops_s": 100.0, "by_kind": {
+        "issue /issue_v2": {"count": 10, "status": {"200": 10}, "outcomes": {}, "latency_ms": {"p50": 5.0, "p95": 10.0}}}}
+    same = copy.deepcopy(base)
+    same["throughput_ops_s"] = 95.0
+    assert tracereplay.compare_runs(base, same)[1] == []
+
+    worse = copy.deepcopy(base)
+    worse["throughput_ops_s"] = 80.0
+    worse["by_kind"]["issue /issue_v2"]["latency_ms"]["p95"] = 20.0
+    worse["by_kind"]["issue /issue_v2"]["status"] = {"200": 9, "500": 1}
+    regressions = tracereplay.compare_runs(base, worse)[1]
+    assert len(regressions) == 3
+    assert tracereplay.report(base, worse) == 1
+    assert tracereplay.report(base, {**same, "workload_sha256": "other"}) == 2